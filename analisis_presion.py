@@ -0,0 +1,1035 @@
+import pandas as pd
+import numpy as np
+from pandas.api.types import union_categoricals
+import plotly.express as px
+import plotly.graph_objects as go
+from datetime import date
+import requests
+import re
+import os
+import json
+import hashlib
+import queue
+import threading
+import io
+import time
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+import contextlib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from fpdf import FPDF
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
+
+# Núcleo de análisis sin dependencias de Streamlit: lo usan la aplicación web y el procesamiento por lotes.
+
+# --- CLASE PARA GENERACIÓN DE PDF ---
+class PDF(FPDF):
+    def __init__(self, *args, generated_on=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generated_on = generated_on or date.today()
+
+    def header(self):
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 10, 'Reporte Técnico de Análisis de Presión', 0, 1, 'C')
+        self.set_font('Arial', '', 8)
+        self.cell(0, 5, f"Fecha de Generación: {self.generated_on.strftime('%d/%m/%Y')}", 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, 'Autor del Reporte: Ing. Leither Torres', 0, 0, 'L')
+        self.cell(0, 10, f'Página {self.page_no()}/{{nb}}', 0, 0, 'R')
+
+    def chapter_title(self, title):
+        self.set_font('Arial', 'B', 12)
+        self.set_fill_color(224, 235, 255)
+        self.cell(0, 8, title, 0, 1, 'L', 1)
+        self.ln(4)
+
+    def chapter_body(self, body):
+        safe_body = body.encode('latin-1', 'replace').decode('latin-1')
+        self.set_font('Arial', '', 10)
+        self.multi_cell(0, 5, safe_body)
+        self.ln()
+
+    def table_header(self, headers, column_widths):
+        self.set_font('Arial', 'B', 7)
+        for header, width in zip(headers, column_widths):
+            self.cell(width, 7, header, 1, 0, 'C')
+        self.ln()
+        self.set_font('Arial', '', 6)
+
+    def table_grid(self, x_edges, top, bottom, row_height):
+        for y in np.arange(top, bottom + row_height / 2, row_height): self.line(x_edges[0], y, x_edges[-1], y)
+        for x in x_edges: self.line(x, top, x, bottom)
+
+    def add_table(self, title, data, column_widths, row_height=6):
+        # Se trabaja por columnas: el texto se escribe con text() y la cuadrícula se traza una vez por página.
+        self.chapter_title(title)
+        headers = [str(h).encode('latin-1', 'replace').decode('latin-1') for h in data.columns]
+        columns = [data[c].astype(str).str.encode('latin-1', 'replace').str.decode('latin-1').tolist() for c in data.columns]
+        x_edges = self.l_margin + np.concatenate([[0], np.cumsum(column_widths[:len(headers)])])
+        x_text = x_edges[:-1] + self.c_margin
+        auto_page_break, margin = self.auto_page_break, self.b_margin
+        self.set_auto_page_break(False)
+        self.table_header(headers, column_widths)
+        top, limit = self.y, self.h - margin
+        for row in zip(*columns):
+            if self.y + row_height > limit:
+                self.table_grid(x_edges, top, self.y, row_height)
+                self.add_page(orientation=self.cur_orientation)
+                self.table_header(headers, column_widths)
+                top = self.y
+            baseline = self.y + row_height / 2 + 0.3 * self.font_size
+            for x, text in zip(x_text, row): self.text(x, baseline, text)
+            self.y += row_height
+        self.table_grid(x_edges, top, self.y, row_height)
+        self.set_auto_page_break(auto_page_break, margin)
+        self.ln(5)
+
+    def add_images(self, title, images):
+        self.chapter_title(title)
+        for image in images:
+            if self.y + self.epw * 0.5 > self.h - self.b_margin: self.add_page(orientation=self.cur_orientation)
+            self.image(io.BytesIO(image), w=self.epw)
+            self.ln(4)
+
+# --- CONFIGURACIÓN DE LA API ---
+API_URL = os.environ.get("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+AI_MODEL = "google/gemini-2.0-flash-exp:free"
+AI_TIMEOUT = (10, 120)
+AI_MAX_RETRIES = 3
+AI_BACKOFF_SECONDS = 1.0
+AI_CACHE_MAX_ENTRIES = 32
+
+# --- FORMATOS DE FECHA SOPORTADOS ---
+# El formato principal se detecta una sola vez sobre una muestra; el resto se usa como respaldo por lotes.
+DATETIME_FORMATS = ["%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M", "%d-%m-%Y %H:%M:%S"]
+DATETIME_FALLBACK = "dayfirst"
+DATETIME_SAMPLE_SIZE = 500
+
+# --- LECTURA POR BLOQUES ---
+SNIFF_BYTES = 64 * 1024
+CSV_CHUNK_ROWS = 100_000
+
+# --- CRITERIOS DEL ANÁLISIS DIARIO ---
+DEFAULT_THRESHOLDS = {"excelente": 18.0, "muy_bueno": 17.5, "bueno": 16.5, "regular": 15.0, "malo": 10.0, "muy_malo": 5.0, "sobrepresion": 25.0}
+STATUS_LEVELS = [("excelente", "Excelente"), ("muy_bueno", "Muy Bueno"), ("bueno", "Bueno"), ("regular", "Regular"), ("malo", "Malo"), ("muy_malo", "Muy Malo (Rotura Probable)")]
+STATUS_SUSPENDED = "Suspensión de Servicio"
+DAY_NAMES_ES = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+GOOD_STATUSES = ["Excelente", "Muy Bueno", "Bueno"]
+# Detección de eventos: el servicio se enciende al alcanzar encendido_psi y se apaga al bajar de apagado_psi (histéresis).
+# Los cortes más breves que min_corte_min se ignoran y los episodios más breves que min_servicio_min se descartan.
+# Un hueco entre lecturas mayor que max_hueco_min cierra el episodio en la última lectura anterior al hueco.
+DEFAULT_EVENT_SETTINGS = {"encendido_psi": 3.0, "apagado_psi": 1.0, "min_servicio_min": 15, "min_corte_min": 10, "max_hueco_min": 60}
+DAILY_METRIC_COLUMNS = ['station', 'date', 'max_pressure', 'arrival_time', 'cut_time', 'duration_hours', 'service_windows']
+EVENT_COLUMNS = ['station', 'date', 'start', 'end', 'duration_hours', 'max_pressure']
+
+def segment_starts(timestamps, codes=None):
+    days = timestamps.astype('datetime64[D]')
+    changed = days[1:] != days[:-1]
+    if codes is not None: changed |= codes[1:] != codes[:-1]
+    return np.flatnonzero(np.r_[True, changed])
+
+def split_events_by_day(events):
+    # Un episodio que cruza la medianoche se reparte entre los días que abarca: cada tramo empieza a las 00:00 o termina a las 24:00.
+    start, end = events['start'].to_numpy(), events['end'].to_numpy()
+    first_day = start.astype('datetime64[D]')
+    pieces = (end.astype('datetime64[D]') - first_day).astype(np.int64) + 1
+    index = np.repeat(np.arange(len(events)), pieces)
+    offset = np.arange(len(index)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    day = (first_day[index] + offset).astype(start.dtype)
+    piece_start, piece_end = np.maximum(start[index], day), np.minimum(end[index], day + np.timedelta64(1, 'D'))
+    # Un episodio que termina justo a medianoche no deja un tramo vacío en el día siguiente.
+    keep = (offset == 0) | (piece_end > piece_start)
+    split = pd.DataFrame({'date': day[keep], 'start': piece_start[keep], 'end': piece_end[keep],
+                          'duration_hours': (piece_end - piece_start)[keep] / np.timedelta64(1, 'h')})
+    if 'station' in events: split.insert(0, 'station', events['station'].array.take(index[keep]))
+    return split
+
+def is_station_sorted(codes, timestamps):
+    if codes is None: return bool(np.all(timestamps[1:] >= timestamps[:-1]))
+    code_step = np.diff(codes.astype(np.int32))
+    return bool(np.all((code_step > 0) | ((code_step == 0) & (timestamps[1:] >= timestamps[:-1]))))
+
+# --- ALMACENAMIENTO COMPACTO EN MEMORIA ---
+# 'standard': float64 + datetime64[ns] (16 bytes/lectura). 'float32': float32 + segundos int32 desde 2000-01-01 (8 bytes).
+# 'centipsi': int16 en centésimas de PSI + segundos int32 desde 2000-01-01 (6 bytes); admite fechas entre 1932 y 2068.
+STORAGE_MODES = ('standard', 'float32', 'centipsi')
+PRESSURE_SCALE = 100
+TIMESTAMP_EPOCH = np.datetime64('2000-01-01T00:00:00', 's')
+
+def encode_timestamps(timestamps, storage):
+    values = np.asarray(timestamps, dtype='datetime64[ns]')
+    if storage == 'standard': return values
+    # Se conserva la resolución de segundos; las fracciones de segundo se truncan.
+    seconds = (values.astype('datetime64[s]') - TIMESTAMP_EPOCH).astype(np.int64)
+    limits = np.iinfo(np.int32)
+    if seconds.size and (seconds.min() < limits.min or seconds.max() > limits.max):
+        raise ValueError("Fechas fuera del rango del formato compacto (1932-2068)")
+    return seconds.astype(np.int32)
+
+def decode_timestamps(values):
+    return (values.astype(np.int64) + TIMESTAMP_EPOCH).astype('datetime64[ns]') if values.dtype.kind == 'i' else values
+
+def encode_pressure(pressure, storage):
+    values = np.asarray(pressure, dtype=np.float64)
+    if storage == 'float32': return values.astype(np.float32)
+    if storage == 'centipsi':
+        limits = np.iinfo(np.int16)
+        return np.rint(np.clip(values * PRESSURE_SCALE, limits.min, limits.max)).astype(np.int16)
+    return values
+
+def decode_pressure(values):
+    return values / PRESSURE_SCALE if values.dtype.kind == 'i' else values
+
+def combine_keys(keys):
+    return hashlib.blake2b('|'.join(keys).encode(), digest_size=16).hexdigest()
+
+def station_base_name(source):
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', None)
+    return os.path.splitext(os.path.basename(str(name)))[0] if name else "Estación"
+
+# --- CACHÉ PERSISTENTE DE DATOS PROCESADOS ---
+CACHE_DIR = os.environ.get("PRESIONES_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "presiones"))
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 4
+FINGERPRINT_BLOCK = 1024 * 1024
+
+def table_to_frame(table):
+    # Las columnas de un solo bloque y sin nulos se usan directamente sobre el archivo mapeado, sin copiarlas.
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if column.num_chunks != 1 or column.null_count: return table.to_pandas()
+        chunk = column.chunk(0)
+        if pa.types.is_dictionary(chunk.type):
+            columns[name] = pd.Categorical.from_codes(chunk.indices.to_numpy(zero_copy_only=True), chunk.dictionary.to_pylist())
+        elif pa.types.is_integer(chunk.type) or pa.types.is_floating(chunk.type) or pa.types.is_timestamp(chunk.type):
+            columns[name] = chunk.to_numpy(zero_copy_only=True)
+        else: return table.to_pandas()
+    return pd.DataFrame(columns, copy=False)
+
+def file_fingerprint(uploaded_file, name=''):
+    digest = hashlib.blake2b(name.encode(), digest_size=16)
+    uploaded_file.seek(0)
+    for block in iter(lambda: uploaded_file.read(FINGERPRINT_BLOCK), b''): digest.update(block)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+class ParsedDataCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = feather is not None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"v{CACHE_VERSION}-{key}.feather")
+
+    def get(self, key):
+        path = self._path(key)
+        if not self.enabled: return None
+        if not os.path.exists(path):
+            self.misses += 1; return None
+        try:
+            table = feather.read_table(path, memory_map=True)
+            os.utime(path)  # El tiempo de modificación marca el último acceso para la expulsión LRU.
+            report = json.loads((table.schema.metadata or {}).get(b'parse_report', b'{}'))
+            self.hits += 1
+            return table_to_frame(table), report
+        except (OSError, ValueError, pa.ArrowException):
+            self.misses += 1
+            self._discard(path); return None
+
+    def put(self, key, data, parse_report):
+        if not self.enabled: return
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'parse_report': json.dumps(parse_report).encode()})
+            feather.write_feather(table, path + '.tmp', compression='uncompressed', chunksize=max(1, len(data)))
+            os.replace(path + '.tmp', path)
+            self._evict()
+        except (OSError, pa.ArrowException):
+            self._discard(path + '.tmp')
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith('.feather')]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        total = 0
+        for entry in entries:
+            total += entry.stat().st_size
+            if total > self.max_bytes: self._discard(entry.path)
+
+    def _discard(self, path):
+        try: os.remove(path)
+        except OSError: pass
+
+# --- PERFILADO POR ETAPAS ---
+class StageProfiler:
+    # Acumula llamadas y tiempos por etapa; lo comparten el hilo de Streamlit y los hilos de PDF.
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try: yield
+        finally: self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self.lock:
+            calls, total, _ = self.stages.get(name, (0, 0.0, 0.0))
+            self.stages[name] = (calls + 1, total + seconds, seconds)
+
+    def summary(self):
+        with self.lock: rows = [(name, calls, last * 1000, total * 1000, total / calls * 1000) for name, (calls, total, last) in self.stages.items()]
+        return pd.DataFrame(rows, columns=["Etapa", "Llamadas", "Última (ms)", "Total (ms)", "Media (ms)"]).round(1)
+
+    def clear(self):
+        with self.lock: self.stages.clear()
+
+def profiled(method):
+    # Mide el método como una etapa si el analizador tiene un perfilador asignado.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None: return method(self, *args, **kwargs)
+        with self.profiler.stage(method.__name__): return method(self, *args, **kwargs)
+    return wrapper
+
+def cache_hit_rates(caches):
+    rows = [(name, cache.hits, cache.misses, cache.hits / (cache.hits + cache.misses) * 100 if cache.hits + cache.misses else 0.0) for name, cache in caches.items()]
+    return pd.DataFrame(rows, columns=["Caché", "Aciertos", "Fallos", "Tasa de acierto (%)"]).round(1)
+
+# --- CLASE PRINCIPAL DE ANÁLISIS ---
+class WaterSystemPressureAnalyzer:
+    def __init__(self, cache=None, storage='standard', event_settings=None):
+        if storage not in STORAGE_MODES: raise ValueError(f"Modo de almacenamiento desconocido: {storage}")
+        self.storage = storage
+        self.data = None
+        self.day_index = None
+        self.thresholds = {}
+        self.event_settings = dict(event_settings or DEFAULT_EVENT_SETTINGS)
+        self.events = None
+        self.profiler = None
+        self.parse_report = {}
+        self.cache = cache
+        self.fingerprint = None
+        self.loaded_from_cache = False
+        self.last_error = None
+        self.daily_metrics = None
+        self.last_update = None
+
+    def set_thresholds(self, thresholds):
+        self.thresholds = thresholds
+
+    def set_event_settings(self, settings):
+        # Los umbrales solo reclasifican; los parámetros de eventos obligan a recalcular episodios y agregados diarios.
+        if settings == self.event_settings: return
+        self.event_settings = dict(settings)
+        if self.data is not None:
+            self.events = self.compute_service_events(self.data)
+            self.daily_metrics = self.compute_daily_metrics(self.data, self.day_index[2][:-1], self.events)
+
+    @property
+    def analysis_key(self):
+        return (self.fingerprint, tuple(sorted(self.event_settings.items())))
+
+    def _fail(self, message):
+        self.last_error = message
+        return False
+
+    def detect_file_format(self, content):
+        lines = content.strip().split('\n')
+        if not lines: return None, None, None
+        first_line = lines[0]
+        separator = '\t'
+        if '\t' in first_line and len(first_line.split('\t')) > 1: separator = '\t'
+        elif ';' in first_line and len(first_line.split(';')) > 1: separator = ';'
+        elif ',' in first_line and len(first_line.split(',')) > 1: separator = ','
+        try:
+            first_column = first_line.split(separator)[0].strip()
+            has_header = not bool(re.match(r'^\d', first_column))
+        except IndexError: has_header = False
+        return separator, has_header, lines
+
+    def detect_datetime_format(self, timestamps, sample_size=DATETIME_SAMPLE_SIZE):
+        step = max(1, len(timestamps) // sample_size)
+        sample = timestamps.iloc[::step].head(sample_size)
+        best_fmt, best_hits = None, 0
+        for fmt in DATETIME_FORMATS:
+            hits = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+            if hits > best_hits: best_fmt, best_hits = fmt, hits
+        return best_fmt
+
+    @profiled
+    def parse_timestamps(self, timestamps, primary=None):
+        timestamps = timestamps.astype(str).str.strip()
+        primary = primary or self.detect_datetime_format(timestamps)
+        parsed = pd.Series(pd.NaT, index=timestamps.index, dtype='datetime64[ns]')
+        report, pending = {}, timestamps
+        # Pasada vectorizada con el formato detectado y reintentos por lotes con los formatos de respaldo.
+        for fmt in ([primary] if primary else []) + [f for f in DATETIME_FORMATS if f != primary]:
+            if pending.empty: break
+            batch = pd.to_datetime(pending, format=fmt, errors='coerce')
+            resolved = batch.notna()
+            if resolved.any():
+                parsed[batch.index[resolved]] = batch[resolved]
+                report[fmt] = int(resolved.sum())
+                pending = pending[~resolved]
+        if not pending.empty:
+            batch = pd.to_datetime(pending, format='mixed', dayfirst=True, errors='coerce')
+            resolved = batch.notna()
+            if resolved.any():
+                parsed[batch.index[resolved]] = batch[resolved]
+                report[DATETIME_FALLBACK] = int(resolved.sum())
+        return parsed, report
+
+    @profiled
+    def load_data(self, files, chunk_rows=CSV_CHUNK_ROWS):
+        # Acepta uno o varios archivos; cada columna de presión de cada archivo es una estación.
+        loaded = self.read_files(files, chunk_rows)
+        if loaded is None: return False
+        self.data, keys, cached = loaded
+        self.fingerprint = keys[0] if len(keys) == 1 else combine_keys(keys)
+        self.loaded_from_cache = all(cached)
+        self.last_update = None
+        self.build_day_index()
+        self.events = self.compute_service_events(self.data)
+        self.daily_metrics = self.compute_daily_metrics(self.data, self.day_index[2][:-1], self.events)
+        return True
+
+    @profiled
+    def append_data(self, files, chunk_rows=CSV_CHUNK_ROWS):
+        # Fusiona lecturas nuevas (con solape) y recalcula solo los días cuyas lecturas cambiaron.
+        if self.data is None: return self.load_data(files, chunk_rows)
+        loaded = self.read_files(files, chunk_rows)
+        if loaded is None: return False
+        new_data, keys, cached = loaded
+        categories = sorted(set(self.stations) | set(new_data['station'].cat.categories))
+        old_data = self.data.assign(station=self.data['station'].cat.set_categories(categories))
+        new_data = new_data.assign(station=new_data['station'].cat.set_categories(categories))
+        if not is_station_sorted(new_data['station'].cat.codes.to_numpy(), new_data['timestamp'].to_numpy()):
+            new_data = new_data.sort_values(['station', 'timestamp'], ignore_index=True)
+        old_codes, new_codes = old_data['station'].cat.codes.to_numpy(), new_data['station'].cat.codes.to_numpy()
+
+        pieces, changed = [], []
+        for code in range(len(categories)):
+            old_block = old_data.iloc[np.searchsorted(old_codes, code):np.searchsorted(old_codes, code, side='right')]
+            new_block = new_data.iloc[np.searchsorted(new_codes, code):np.searchsorted(new_codes, code, side='right')]
+            if new_block.empty:
+                pieces.append(old_block); continue
+            # La historia anterior a la primera lectura nueva no se toca; solo se fusiona la cola solapada.
+            split = np.searchsorted(old_block['timestamp'].to_numpy(), new_block['timestamp'].to_numpy()[0])
+            old_tail = old_block.iloc[split:]
+            previous = old_tail.drop_duplicates('timestamp', keep='last').set_index('timestamp')['pressure'].reindex(new_block['timestamp'])
+            modified = previous.isna().to_numpy() | (previous.to_numpy() != new_block['pressure'].to_numpy())
+            changed.append(pd.DataFrame({'station': code, 'date': np.unique(decode_timestamps(new_block['timestamp'].to_numpy()[modified]).astype('datetime64[D]'))}))
+            tail = pd.concat([old_tail, new_block], ignore_index=True).sort_values('timestamp', kind='stable')
+            pieces += [old_block.iloc[:split], tail.drop_duplicates('timestamp', keep='last')]
+
+        self.data = pd.concat(pieces, ignore_index=True)
+        del pieces, old_data
+        self.fingerprint = combine_keys([self.fingerprint] + keys)
+        self.loaded_from_cache = self.loaded_from_cache and all(cached)
+        self.build_day_index()
+        changed = self.update_service_events(categories, pd.concat(changed, ignore_index=True))
+        self.update_daily_metrics(categories, changed)
+        self.last_update = {'rows': len(new_data), 'days': len(changed)}
+        return True
+
+    def update_service_events(self, categories, changed):
+        # Cada estación modificada se reanaliza desde el último evento que empieza antes del primer día cambiado:
+        # ese punto es siempre un encendido, así que el estado de histéresis y el antirrebote coinciden con una carga completa.
+        events = self.events.assign(station=self.events['station'].cat.set_categories(categories))
+        event_codes = events['station'].cat.codes.to_numpy()
+        codes, raw_timestamps = self.data['station'].cat.codes.to_numpy(), self.data['timestamp'].to_numpy()
+        stale, fresh = np.zeros(len(events), dtype=bool), []
+        for code, first_day in changed.groupby('station')['date'].min().items():
+            lo, hi = np.searchsorted(codes, code), np.searchsorted(codes, code, side='right')
+            station_events = (event_codes == code)
+            earlier = np.flatnonzero(station_events & (events['start'].to_numpy() < np.datetime64(first_day, 'ns')))
+            if earlier.size:
+                restart = events['start'].to_numpy()[earlier[-1]]
+                lo += np.searchsorted(raw_timestamps[lo:hi], encode_timestamps([restart], self.storage)[0])
+                station_events &= events['start'].to_numpy() >= restart
+            stale |= station_events
+            fresh.append(self.compute_service_events(self.data.iloc[lo:hi]))
+        touched = split_events_by_day(pd.concat([events[stale]] + fresh, ignore_index=True))
+        self.events = pd.concat([events[~stale]] + fresh, ignore_index=True).sort_values(['station', 'start'], ignore_index=True)
+        # Los días por los que pasan los episodios cambiados también deben recalcularse.
+        touched = pd.DataFrame({'station': touched['station'].cat.codes.to_numpy(), 'date': touched['date'].to_numpy()})
+        changed = changed.assign(date=changed['date'].to_numpy().astype('datetime64[ns]'))
+        return pd.concat([changed, touched], ignore_index=True).drop_duplicates(ignore_index=True)
+
+    def update_daily_metrics(self, categories, changed):
+        seg_codes, days, bounds = self.day_index
+        segment_keys = pd.MultiIndex.from_arrays([seg_codes, days.astype('datetime64[ns]')])
+        changed_keys = pd.MultiIndex.from_arrays([changed['station'].to_numpy(), changed['date'].to_numpy().astype('datetime64[ns]')])
+        segments = np.flatnonzero(segment_keys.isin(changed_keys))
+        daily = self.daily_metrics.assign(station=self.daily_metrics['station'].cat.set_categories(categories))
+        if segments.size:
+            # Solo se vuelven a reducir las filas de los segmentos (estación, día) modificados.
+            lengths = bounds[segments + 1] - bounds[segments]
+            offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+            rows = np.repeat(bounds[segments] - offsets, lengths) + np.arange(lengths.sum())
+            daily_keys = pd.MultiIndex.from_arrays([daily['station'].cat.codes.to_numpy(), daily['date'].to_numpy().astype('datetime64[ns]')])
+            daily = pd.concat([daily[~daily_keys.isin(changed_keys)], self.compute_daily_metrics(self.data.iloc[rows], offsets, self.events)], ignore_index=True)
+            daily = daily.sort_values(['station', 'date'], ignore_index=True)
+        self.daily_metrics = daily
+
+    def events_for(self, station, start_date=None, end_date=None):
+        events = self.events[self.events['station'] == station]
+        # Se incluyen los episodios que solapan el rango, aunque empiecen el día anterior.
+        if start_date is not None: events = events[events['end'] >= pd.Timestamp(start_date)]
+        if end_date is not None: events = events[events['start'] < pd.Timestamp(end_date) + pd.Timedelta(days=1)]
+        return events.reset_index(drop=True)
+
+    def daily_metrics_for(self, station, start_date=None, end_date=None):
+        daily = self.daily_metrics[self.daily_metrics['station'] == station]
+        if start_date is not None: daily = daily[daily['date'] >= pd.Timestamp(start_date)]
+        if end_date is not None: daily = daily[daily['date'] <= pd.Timestamp(end_date)]
+        return daily.reset_index(drop=True)
+
+    @profiled
+    def read_files(self, files, chunk_rows=CSV_CHUNK_ROWS):
+        files = list(files) if isinstance(files, (list, tuple)) else [files]
+        self.last_error, self.parse_report = None, {}
+        frames, keys, cached = [], [], []
+        for source in files:
+            loaded = self.load_file(source, chunk_rows)
+            if loaded is None:
+                if len(files) > 1: self.last_error = f"{self.last_error} ({station_base_name(source)})"
+                return None
+            frames.append(loaded[0]); keys.append(loaded[1]); cached.append(loaded[2])
+
+        stations = union_categoricals([frame['station'] for frame in frames], sort_categories=True)
+        data = pd.DataFrame({
+            'timestamp': np.concatenate([frame['timestamp'].to_numpy() for frame in frames]) if len(frames) > 1 else frames[0]['timestamp'].to_numpy(),
+            'station': stations,
+            'pressure': np.concatenate([frame['pressure'].to_numpy() for frame in frames]) if len(frames) > 1 else frames[0]['pressure'].to_numpy()
+        })
+        del frames
+        if not is_station_sorted(data['station'].cat.codes.to_numpy(), data['timestamp'].to_numpy()):
+            data = data.sort_values(['station', 'timestamp'], ignore_index=True)
+        if len(files) > 1:
+            # Archivos con el mismo nombre de estación se fusionan como en append_data: ante una marca repetida gana el último archivo.
+            duplicated = data.duplicated(['station', 'timestamp'], keep='last').to_numpy()
+            if duplicated.any(): data = data[~duplicated].reset_index(drop=True)
+        return data, keys, cached
+
+    def load_file(self, uploaded_file, chunk_rows=CSV_CHUNK_ROWS):
+        if isinstance(uploaded_file, (str, os.PathLike)):
+            with open(uploaded_file, 'rb') as f: return self.load_file(f, chunk_rows)
+        try:
+            name = station_base_name(uploaded_file)
+            key = file_fingerprint(uploaded_file, name if self.storage == 'standard' else f"{name}|{self.storage}")
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                frame, report = cached
+                for fmt, count in report.items(): self.parse_report[fmt] = self.parse_report.get(fmt, 0) + count
+                return frame, key, True
+
+            # Solo se lee un prefijo para detectar separador y encabezado; el resto se procesa por bloques.
+            uploaded_file.seek(0)
+            prefix = uploaded_file.read(SNIFF_BYTES).decode('utf-8', errors='ignore')
+            separator, has_header, lines = self.detect_file_format(prefix)
+            n_columns = len(lines[0].split(separator)) if lines else 0
+            if n_columns < 2:
+                self._fail(f"❌ El archivo no tiene al menos 2 columnas. Verifique el separador."); return None
+
+            uploaded_file.seek(0)
+            reader = pd.read_csv(uploaded_file, sep=separator, header=0 if has_header else None, usecols=range(n_columns), dtype=str,
+                                 engine='c', skipinitialspace=True, chunksize=chunk_rows, encoding='utf-8', encoding_errors='ignore')
+            channels, parts, report = None, None, {}
+            fmt, total_rows, numeric_rows = None, 0, 0
+            for chunk in reader:
+                if channels is None:
+                    # Un separador final produce columnas "Unnamed: k"; solo cuentan si traen lecturas.
+                    channels = [str(c).strip() if has_header and not str(c).startswith('Unnamed:') else f"Canal {i}" for i, c in enumerate(chunk.columns[1:], start=1)]
+                    parts = [[] for _ in channels]
+                chunk = chunk.dropna(how='all')
+                total_rows += len(chunk)
+
+                pressures = chunk.iloc[:, 1:].apply(lambda col: pd.to_numeric(col.str.strip().str.replace(',', '.', regex=False), errors='coerce'))
+                valid = pressures.notna()
+                any_valid = valid.any(axis=1)
+                numeric_rows += int(any_valid.sum())
+                if not any_valid.any(): continue
+
+                timestamp_str = chunk.iloc[:, 0][any_valid]
+                fmt = fmt or self.detect_datetime_format(timestamp_str.astype(str).str.strip())
+                timestamps, chunk_report = self.parse_timestamps(timestamp_str, fmt)
+                for key_fmt, count in chunk_report.items(): report[key_fmt] = report.get(key_fmt, 0) + count
+                dated = timestamps.notna()
+                for i in range(len(channels)):
+                    keep = valid.iloc[:, i][any_valid] & dated
+                    if keep.any(): parts[i].append(pd.DataFrame({'timestamp': encode_timestamps(timestamps[keep], self.storage), 'pressure': encode_pressure(pressures.iloc[:, i][any_valid][keep], self.storage)}))
+
+            if total_rows == 0: self._fail("❌ El archivo no contiene filas con datos."); return None
+            if numeric_rows == 0: self._fail("❌ No se encontraron valores de presión numéricos válidos."); return None
+            # Las estaciones se definen solo con los canales que produjeron lecturas.
+            active = [i for i, station_parts in enumerate(parts) if station_parts]
+            stations = [name] if len(active) == 1 else [f"{name} · {channels[i]}" for i in active]
+            frames, codes = [], []
+            for code, i in enumerate(active):
+                frame = pd.concat(parts[i], ignore_index=True)
+                if not frame['timestamp'].is_monotonic_increasing: frame = frame.sort_values('timestamp', ignore_index=True)
+                frames.append(frame); codes.append(np.full(len(frame), code, dtype=np.int16))
+            del parts
+            if not frames: self._fail("❌ No se pudo interpretar ninguna fecha."); return None
+
+            df = pd.concat(frames, ignore_index=True)
+            df.insert(1, 'station', pd.Categorical.from_codes(np.concatenate(codes), categories=stations))
+            for fmt_key, count in report.items(): self.parse_report[fmt_key] = self.parse_report.get(fmt_key, 0) + count
+            if self.cache: self.cache.put(key, df, report)
+            return df, key, False
+        except Exception as e:
+            self._fail(f"❌ Error al procesar el archivo: {e}"); return None
+
+    def classify_status(self, max_pressure):
+        conditions = [max_pressure >= self.thresholds[key] for key, _ in STATUS_LEVELS]
+        labels = np.select(conditions, [label for _, label in STATUS_LEVELS], default=STATUS_SUSPENDED)
+        return pd.Series(labels, index=max_pressure.index)
+
+    @property
+    def stations(self):
+        return [] if self.data is None else list(self.data['station'].cat.categories)
+
+    def build_day_index(self):
+        codes, timestamps = self.data['station'].cat.codes.to_numpy(), decode_timestamps(self.data['timestamp'].to_numpy())
+        starts = segment_starts(timestamps, codes)
+        self.day_index = (codes[starts], timestamps[starts].astype('datetime64[D]'), np.append(starts, len(timestamps)))
+
+    def date_bounds(self):
+        days = self.day_index[1]
+        return days.min().astype(object), days.max().astype(object)
+
+    def memory_report(self):
+        # Memoria real de las lecturas frente a la que ocuparían con float64 + datetime64[ns].
+        if self.data is None: return None
+        station_bytes = int(self.data['station'].memory_usage(index=False, deep=True))
+        return {'storage': self.storage, 'rows': len(self.data), 'bytes': int(self.data.memory_usage(index=False, deep=True).sum()),
+                'standard_bytes': len(self.data) * 16 + station_bytes}
+
+    def slice_by_date(self, start_date, end_date, station=None):
+        # Búsqueda binaria sobre los días ordenados de la estación; devuelve una vista contigua y sus desplazamientos diarios.
+        seg_codes, days, bounds = self.day_index
+        code = self.stations.index(station) if station is not None else 0
+        first, last = np.searchsorted(seg_codes, code), np.searchsorted(seg_codes, code, side='right')
+        lo = first if start_date is None else first + np.searchsorted(days[first:last], np.datetime64(start_date, 'D'))
+        hi = last if end_date is None else first + np.searchsorted(days[first:last], np.datetime64(end_date, 'D'), side='right')
+        return self.data.iloc[bounds[lo]:bounds[hi]], bounds[lo:hi] - bounds[lo]
+
+    @profiled
+    def compute_service_events(self, data):
+        # Todos los episodios de servicio de la serie en un recorrido vectorizado: histéresis, tramos y antirrebote.
+        if data is None or data.empty: return pd.DataFrame(columns=EVENT_COLUMNS)
+        settings = self.event_settings
+        codes = data['station'].cat.codes.to_numpy() if 'station' in data else None
+        timestamps, pressure = decode_timestamps(data['timestamp'].to_numpy()), decode_pressure(data['pressure'].to_numpy())
+        n = len(timestamps)
+        resets = np.zeros(n, dtype=bool); resets[0] = True
+        if codes is not None: resets[1:] = codes[1:] != codes[:-1]
+        # Un hueco largo en las lecturas no cuenta como servicio: la serie se corta ahí como si empezara una estación nueva.
+        resets[1:] |= np.diff(timestamps) > np.timedelta64(int(settings['max_hueco_min'] * 60), 's')
+        # Entre apagado_psi y encendido_psi se conserva el estado de la última lectura decisiva (apagado al inicio de cada tramo).
+        on = pressure >= settings['encendido_psi']
+        decisive = on | (pressure < settings['apagado_psi']) | resets
+        state = on[np.maximum.accumulate(np.where(decisive, np.arange(n), 0))]
+        run_starts = np.flatnonzero(np.r_[True, state[1:] != state[:-1]] | resets)
+        run_ends = np.append(run_starts[1:], n)
+        run_peaks = np.maximum.reduceat(pressure, run_starts)
+        on_runs = state[run_starts]
+        starts, ends, peaks = run_starts[on_runs], run_ends[on_runs], run_peaks[on_runs]
+        # El fin de un episodio es la primera lectura apagada; si el tramo termina encendido (fin de estación o hueco), su última lectura.
+        closed = (ends < n) & ~resets[np.minimum(ends, n - 1)]
+        start_times, end_times = timestamps[starts], timestamps[np.where(closed, ends, ends - 1)]
+        run_codes = codes[starts] if codes is not None else np.zeros(len(starts), dtype=np.int8)
+
+        # Antirrebote: se unen los episodios del mismo tramo separados por cortes breves y luego se descartan los episodios breves.
+        segments = np.cumsum(resets)[starts]
+        merge = np.zeros(len(starts), dtype=bool)
+        merge[1:] = (segments[1:] == segments[:-1]) & (start_times[1:] - end_times[:-1] < np.timedelta64(int(settings['min_corte_min'] * 60), 's'))
+        # Sin ninguna lectura que alcance encendido_psi no hay episodios: se devuelve la tabla vacía con los mismos tipos.
+        first = np.flatnonzero(~merge)
+        last = np.append(first[1:], len(starts)) - 1 if first.size else first
+        start, end = start_times[first], end_times[last]
+        duration = (end - start) / np.timedelta64(1, 'h')
+        keep = duration >= settings['min_servicio_min'] / 60
+        events = pd.DataFrame({
+            'date': start[keep].astype('datetime64[D]').astype(start.dtype), 'start': start[keep], 'end': end[keep], 'duration_hours': duration[keep],
+            'max_pressure': (np.maximum.reduceat(peaks, first) if first.size else peaks)[keep].astype(np.float64)
+        })
+        if codes is not None: events.insert(0, 'station', pd.Categorical.from_codes(run_codes[first][keep], categories=data['station'].cat.categories))
+        return events
+
+    def daily_event_metrics(self, events):
+        keys = ['station', 'date'] if 'station' in events else ['date']
+        return split_events_by_day(events).groupby(keys, observed=True, sort=False).agg(
+            arrival_time=('start', 'min'), cut_time=('end', 'max'), duration_hours=('duration_hours', 'sum'), service_windows=('start', 'size')).reset_index()
+
+    @profiled
+    def compute_daily_metrics(self, data, day_offsets=None, events=None):
+        # Máxima diaria por segmento (estación, día); llegada, corte y duración salen de la tabla de eventos.
+        if data is None or data.empty: return pd.DataFrame(columns=DAILY_METRIC_COLUMNS)
+        codes = data['station'].cat.codes.to_numpy() if 'station' in data else None
+        if day_offsets is None and not is_station_sorted(codes, data['timestamp'].to_numpy()):
+            data = data.sort_values(['station', 'timestamp'] if codes is not None else 'timestamp')
+            codes = data['station'].cat.codes.to_numpy() if codes is not None else None
+        timestamps, pressure = decode_timestamps(data['timestamp'].to_numpy()), decode_pressure(data['pressure'].to_numpy())
+        if day_offsets is None: day_offsets = segment_starts(timestamps, codes)
+        if events is None: events = self.compute_service_events(data)
+        daily = pd.DataFrame({
+            'date': timestamps[day_offsets].astype('datetime64[D]').astype(timestamps.dtype),
+            'max_pressure': np.maximum.reduceat(pressure, day_offsets).astype(np.float64)
+        })
+        if codes is not None: daily.insert(0, 'station', pd.Categorical.from_codes(codes[day_offsets], categories=data['station'].cat.categories))
+        daily = daily.merge(self.daily_event_metrics(events), how='left', on=['station', 'date'] if codes is not None else ['date'])
+        daily['duration_hours'] = daily['duration_hours'].fillna(0)
+        daily['service_windows'] = daily['service_windows'].fillna(0).astype(np.int64)
+        return daily
+
+    def classify_daily(self, daily):
+        return daily.assign(status=self.classify_status(daily['max_pressure']))
+
+    @profiled
+    def format_daily_summary(self, daily):
+        if daily.empty: return pd.DataFrame()
+        summary = pd.DataFrame({
+            "Fecha": daily['date'].dt.strftime('%d/%m/%Y'), "Día": np.array(DAY_NAMES_ES)[daily['date'].dt.dayofweek], "Estado": daily['status'],
+            "Presión Máx (PSI)": daily['max_pressure'].map('{:.2f}'.format),
+            "Hora Llegada": daily['arrival_time'].dt.strftime('%H:%M').fillna("N/A"),
+            "Hora Corte": daily['cut_time'].dt.strftime('%H:%M').where(daily['cut_time'] != daily['date'] + pd.Timedelta(days=1), "24:00").fillna("N/A"),
+            "Duración (H)": daily['duration_hours'].map('{:.2f}'.format),
+            "Interrupciones": (daily['service_windows'] - 1).clip(lower=0)
+        })
+        if 'station' in daily and daily['station'].nunique() > 1: summary.insert(0, "Estación", daily['station'].astype(str))
+        return summary
+
+    def summarize_stations(self, daily):
+        good = daily['status'].isin(GOOD_STATUSES)
+        overpressure = daily['max_pressure'] > self.thresholds['sobrepresion']
+        summary = daily.assign(good=good, overpressure=overpressure).groupby('station', observed=True).agg(
+            dias=('date', 'size'), buenos=('good', 'sum'), sobrepresion=('overpressure', 'sum'),
+            presion_max=('max_pressure', 'max'), presion_max_media=('max_pressure', 'mean'), duracion_media=('duration_hours', 'mean'))
+        summary.index = summary.index.astype(str)
+        return summary.round(2).rename_axis("Estación").rename(columns={
+            'dias': "Días", 'buenos': "Días Buen Servicio", 'sobrepresion': "Días con Sobrepresión", 'presion_max': "Presión Máx (PSI)",
+            'presion_max_media': "Máx Diaria Promedio (PSI)", 'duracion_media': "Duración Media (H)"})
+
+    @profiled
+    def analyze_daily_performance(self, data):
+        if data is None or data.empty: return pd.DataFrame()
+        return self.format_daily_summary(self.classify_daily(self.compute_daily_metrics(data)))
+
+# --- FUNCIONES DE VISUALIZACIÓN ---
+CHART_MAX_POINTS = 5000
+
+def downsample_min_max(data, max_points=CHART_MAX_POINTS):
+    # Conserva el mínimo y el máximo de cada intervalo para no perder picos ni caídas.
+    n = len(data)
+    if n <= max_points: return data
+    bucket_id = np.arange(n) * max(1, max_points // 2) // n
+    grouped = pd.Series(data['pressure'].to_numpy()).groupby(bucket_id)
+    keep = np.union1d(np.union1d(grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy()), [0, n - 1])
+    return data.iloc[keep]
+
+def service_window_trace(events, top):
+    # Todas las ventanas de servicio en una sola traza rellena (rectángulos separados por huecos), no una forma por evento.
+    n = len(events)
+    x = np.empty(n * 5, dtype=object); y = np.empty(n * 5, dtype=object)
+    x[0::5], x[1::5], x[2::5], x[3::5] = events['start'], events['start'], events['end'], events['end']
+    y[0::5], y[1::5], y[2::5], y[3::5] = 0, top, top, 0
+    return go.Scatter(x=x, y=y, mode='lines', fill='toself', fillcolor='rgba(42, 157, 143, 0.12)', line=dict(width=0), name='Servicio', hoverinfo='skip')
+
+def create_time_series_chart(data, thresholds, max_points=CHART_MAX_POINTS, use_webgl=False, events=None):
+    plot_data = downsample_min_max(data, max_points)
+    scatter = go.Scattergl if use_webgl else go.Scatter
+    fig = go.Figure()
+    if events is not None and not events.empty: fig.add_trace(service_window_trace(events, max(float(events['max_pressure'].max()), thresholds['excelente'])))
+    fig.add_trace(scatter(x=decode_timestamps(plot_data['timestamp'].to_numpy()), y=decode_pressure(plot_data['pressure'].to_numpy()), mode='lines', name='Presión', line=dict(color='#005f73', width=1.5)))
+    fig.add_hline(y=thresholds['excelente'], line_dash="dash", line_color="#2a9d8f", annotation_text=f"Excelente ≥ {thresholds['excelente']} PSI")
+    fig.add_hline(y=thresholds['sobrepresion'], line_dash="dot", line_color="#9b2226", annotation_text=f"Sobrepresión > {thresholds['sobrepresion']} PSI")
+    
+    if not data.empty:
+        fig.add_hrect(y0=0, y1=thresholds['muy_malo'], fillcolor="#e76f51", opacity=0.1, layer="below", line_width=0, annotation_text="Suspensión")
+        
+    title = '<b>Análisis Temporal de Presión del Sistema</b>'
+    if len(plot_data) < len(data): title += f"<br><sup>{len(plot_data):,} de {len(data):,} lecturas (mínimo y máximo por intervalo)</sup>"
+    fig.update_layout(title=title, xaxis_title='Fecha y Hora', yaxis_title='Presión (PSI)', height=500, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    return fig
+
+def create_duration_chart(daily_summary):
+    if daily_summary.empty: return go.Figure()
+    summary = daily_summary.copy()
+    summary['Duración (H)'] = pd.to_numeric(summary['Duración (H)'])
+    
+    color_map = {
+        "Excelente": "#2a9d8f", "Muy Bueno": "#5fba7d", "Bueno": "#8acb88",
+        "Regular": "#e9c46a", "Malo": "#f4a261", "Muy Malo (Rotura Probable)": "#e76f51",
+        "Suspensión de Servicio": "#d00000"
+    }
+    
+    fig = px.bar(summary, x='Fecha', y='Duración (H)', title='<b>Duración Diaria del Servicio con Presión Adecuada</b>',
+                 labels={'Fecha': 'Día', 'Duración (H)': 'Horas de Servicio'},
+                 color='Estado', color_discrete_map=color_map)
+    fig.update_layout(xaxis={'type': 'category'})
+    return fig
+
+def create_station_comparison_chart(daily_metrics):
+    if daily_metrics.empty: return go.Figure()
+    fig = px.line(daily_metrics, x='date', y='max_pressure', color='station', markers=True, title='<b>Presión Máxima Diaria por Estación</b>',
+                  labels={'date': 'Día', 'max_pressure': 'Presión Máx (PSI)', 'station': 'Estación'})
+    fig.update_layout(height=450, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    return fig
+
+# --- MEMORIZACIÓN DEL ANÁLISIS ENTRE RECARGAS ---
+MEMO_MAX_AGGREGATES = 32
+MEMO_MAX_VIEWS = 8
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1; return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock: self.entries.clear()
+
+class AnalysisMemo:
+    # Nivel 1: agregados diarios por (huella, estación, rango). Nivel 2: clasificación y gráficos por umbrales.
+    def __init__(self, max_aggregates=MEMO_MAX_AGGREGATES, max_views=MEMO_MAX_VIEWS, profiler=None):
+        self.aggregates = LRUCache(max_aggregates)
+        self.views = LRUCache(max_views)
+        self.profiler = profiler
+
+    def stage(self, name):
+        return self.profiler.stage(name) if self.profiler else contextlib.nullcontext()
+
+    def daily_view(self, analyzer, station, data, date_range, thresholds, chart_options):
+        base_key = (analyzer.analysis_key, station, *date_range)
+
+        def build():
+            daily_metrics = analyzer.classify_daily(self.aggregates.get_or_compute(base_key, lambda: analyzer.daily_metrics_for(station, *date_range)))
+            daily_summary = analyzer.format_daily_summary(daily_metrics)
+            with self.stage('create_time_series_chart'): fig_time = create_time_series_chart(data, thresholds, events=analyzer.events_for(station, *date_range), **chart_options)
+            with self.stage('create_duration_chart'): fig_duration = create_duration_chart(daily_summary)
+            return {
+                'daily_metrics': daily_metrics, 'daily_summary': daily_summary,
+                'status_counts': daily_metrics['status'].value_counts(),
+                'dias_sobrepresion': int((daily_metrics['max_pressure'] > thresholds['sobrepresion']).sum()),
+                'fig_time': fig_time, 'fig_duration': fig_duration
+            }
+        return self.views.get_or_compute(base_key + (tuple(sorted(thresholds.items())), tuple(sorted(chart_options.items()))), build)
+
+    def comparison_view(self, analyzer, date_range, thresholds):
+        def build():
+            daily = analyzer.classify_daily(analyzer.daily_metrics)
+            if date_range[0] is not None:
+                daily = daily[(daily['date'] >= pd.Timestamp(date_range[0])) & (daily['date'] <= pd.Timestamp(date_range[1]))]
+            return {'station_summary': analyzer.summarize_stations(daily), 'fig_comparison': create_station_comparison_chart(daily)}
+        return self.views.get_or_compute(('comparacion', analyzer.analysis_key, *date_range, tuple(sorted(thresholds.items()))), build)
+
+# --- FUNCIONES DE REPORTE ---
+class AIReportError(Exception):
+    pass
+
+def create_api_session(max_retries=AI_MAX_RETRIES, backoff=AI_BACKOFF_SECONDS):
+    # Sesión reutilizable con reintentos y espera exponencial ante errores de conexión, 429 y 5xx.
+    retry = Retry(total=max_retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None, raise_on_status=False)
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(max_retries=retry))
+    session.mount('http://', HTTPAdapter(max_retries=retry))
+    return session
+
+def build_ai_messages(daily_summary, system_prompt):
+    user_content = f"Por favor, genera un reporte técnico en español basado en el siguiente resumen de rendimiento diario:\n\nTABLA DE RENDIMIENTO DIARIO:\n{daily_summary.to_string()}\n\nAnaliza esta tabla siguiendo las instrucciones del sistema."
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}]
+
+def ai_report_key(daily_summary, system_prompt, model=AI_MODEL):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (daily_summary.to_csv(index=False), system_prompt, model): digest.update(part.encode()); digest.update(b'\0')
+    return digest.hexdigest()
+
+def stream_ai_report(daily_summary, system_prompt, api_key, api_url=API_URL, model=AI_MODEL, session=None, timeout=AI_TIMEOUT):
+    # Genera los fragmentos de texto y devuelve (valor de StopIteration) si el flujo terminó con "data: [DONE]".
+    payload = {"model": model, "messages": build_ai_messages(daily_summary, system_prompt), "stream": True}
+    response = (session or requests).post(api_url, headers={"Authorization": f"Bearer {api_key}"}, json=payload, stream=True, timeout=timeout)
+    with response:
+        if response.status_code != 200: raise AIReportError(f"Error en la API: {response.status_code} - {response.text}")
+        response.encoding = 'utf-8'
+        # Eventos SSE: "data: {...}" por fragmento; las líneas de comentario (": ...") mantienen viva la conexión.
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith('data:'): continue
+            data = line[5:].strip()
+            if data == '[DONE]': return True
+            chunk = json.loads(data)
+            if 'error' in chunk:
+                error = chunk['error']
+                raise AIReportError(f"Error en la API: {error.get('message', error) if isinstance(error, dict) else error}")
+            content = chunk['choices'][0].get('delta', {}).get('content')
+            if content: yield content
+    return False
+
+class AIReportJob:
+    # La petición corre en un hilo aparte; el script de Streamlit solo consume los fragmentos de la cola.
+    def __init__(self, daily_summary, system_prompt, api_key, api_url=API_URL, model=AI_MODEL, cache=None, session=None, timeout=AI_TIMEOUT):
+        self.key = ai_report_key(daily_summary, system_prompt, model)
+        self.cache = cache
+        self.timeout = timeout
+        self.chunks = queue.Queue()
+        self.error = None
+        self.from_cache = False
+        self.complete = False
+        cached = cache.get(self.key) if cache else None
+        if cached is not None:
+            self.from_cache = self.complete = True
+            self.chunks.put(cached); self.chunks.put(None)
+        else:
+            args = (daily_summary, system_prompt, api_key, api_url, model, session, timeout)
+            threading.Thread(target=self._run, args=args, daemon=True).start()
+
+    def _stream(self, *args):
+        self.complete = yield from stream_ai_report(*args)
+
+    def _run(self, *args):
+        parts = []
+        try:
+            for content in self._stream(*args):
+                parts.append(content); self.chunks.put(content)
+            # Un flujo cerrado sin "[DONE]" (p. ej. un proxy que corta la respuesta) es un reporte incompleto: se avisa y no se guarda.
+            if not self.complete: raise AIReportError("la respuesta de la API se cortó antes de terminar.")
+            if self.cache and parts: self.cache.put(self.key, ''.join(parts))
+        except Exception as e:
+            # Cualquier fallo del hilo debe llegar al usuario como mensaje, nunca como un reporte vacío.
+            self.error = f"Error generando reporte: {e}"
+            self.chunks.put(("\n\n" if parts else "") + self.error)
+        finally:
+            self.chunks.put(None)
+
+    def iter_chunks(self):
+        while True:
+            try: content = self.chunks.get(timeout=self.timeout[1])
+            except queue.Empty:
+                self.error = "Error generando reporte: tiempo de espera agotado."
+                yield self.error; return
+            if content is None: return
+            yield content
+
+def generate_ai_report(daily_summary, system_prompt, api_key, api_url=API_URL, model=AI_MODEL, cache=None, session=None):
+    return ''.join(AIReportJob(daily_summary, system_prompt, api_key, api_url, model, cache, session).iter_chunks())
+
+# --- GENERACIÓN DE PDF EN SEGUNDO PLANO ---
+PDF_WORKERS = 2
+PDF_CACHE_MAX_ENTRIES = 8
+CHART_IMAGE_WIDTH = 1200
+CHART_IMAGE_HEIGHT = 500
+
+def render_chart_images(figures, width=CHART_IMAGE_WIDTH, height=CHART_IMAGE_HEIGHT):
+    # Requiere kaleido (y Chrome); si no está disponible el PDF se genera sin gráficos.
+    images = []
+    for fig in figures:
+        try: images.append(fig.to_image(format='png', width=width, height=height, scale=2))
+        except Exception: return []
+    return images
+
+def pdf_report_key(daily_summary, ai_report, figures=(), generated_on=None):
+    # La fecha de generación impresa en cada página forma parte de la clave: un PDF en caché nunca muestra un día anterior.
+    digest = hashlib.blake2b(digest_size=16)
+    parts = [daily_summary.to_csv(index=False), ai_report, (generated_on or date.today()).isoformat()] + [fig.to_json() for fig in figures]
+    for part in parts: digest.update(part.encode()); digest.update(b'\0')
+    return digest.hexdigest()
+
+class PDFReportBuilder:
+    # Construye los PDF en segundo plano y reutiliza los bytes de entradas idénticas.
+    # Cada resultado es (bytes, gráficos_incluidos): sin kaleido el PDF sale sin las páginas de gráficos.
+    def __init__(self, max_workers=PDF_WORKERS, max_entries=PDF_CACHE_MAX_ENTRIES):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf')
+        self.cache = LRUCache(max_entries)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, daily_summary, ai_report, figures=(), profiler=None):
+        generated_on = date.today()
+        key = pdf_report_key(daily_summary, ai_report, figures, generated_on)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = Future(); future.set_result(cached); return future
+        with self.lock:
+            if key not in self.pending:
+                self.pending[key] = self.executor.submit(self._build, key, daily_summary, ai_report, figures, generated_on, profiler)
+            return self.pending[key]
+
+    def _build(self, key, daily_summary, ai_report, figures, generated_on, profiler=None):
+        try:
+            stage = profiler.stage if profiler else (lambda name: contextlib.nullcontext())
+            with stage('render_chart_images'): images = render_chart_images(figures)
+            with stage('generate_pdf_report'): pdf_bytes = generate_pdf_report(daily_summary, ai_report, images, generated_on)
+            result = (pdf_bytes, len(images) == len(figures))
+            self.cache.put(key, result)
+            return result
+        finally:
+            with self.lock: self.pending.pop(key, None)
+
+def generate_pdf_report(daily_summary, ai_report, chart_images=(), generated_on=None):
+    pdf = PDF('P', 'mm', 'A4', generated_on=generated_on)
+    pdf.alias_nb_pages()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 18)
+    pdf.cell(0, 15, 'Reporte Técnico de Análisis de Presión', 0, 1, 'C'); pdf.ln(5)
+    
+    body_text = ai_report.replace('**', '').replace('##', '')
+    lines = body_text.split('\n')
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        if re.match(r'^\d+\.\s+[A-Z\s]+:', line):
+            pdf.chapter_title(line.replace(':', ''))
+        else:
+            pdf.set_font('Arial', '', 10)
+            pdf.multi_cell(0, 5, line.encode('latin-1', 'replace').decode('latin-1')); pdf.ln(1)
+            
+    if chart_images:
+        pdf.add_page(orientation='L')
+        pdf.add_images("Gráficos del Análisis", chart_images)
+
+    pdf.add_page(orientation='L')
+    column_widths = ([40] if "Estación" in daily_summary.columns else []) + [25, 25, 40, 30, 30, 30, 30, 22]
+    pdf.add_table("Tabla de Rendimiento Diario Detallado", daily_summary, column_widths)
+    return bytes(pdf.output())
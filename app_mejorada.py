@@ -1,26 +1,25 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, time
-import requests
-from io import StringIO
-import re
+from datetime import datetime
 import warnings
-from fpdf import FPDF
+from analisis_presion import (
+    WaterSystemPressureAnalyzer, ParsedDataCache, AnalysisMemo, LRUCache, AIReportJob, DEFAULT_THRESHOLDS, DEFAULT_EVENT_SETTINGS, CHART_MAX_POINTS,
+    AI_CACHE_MAX_ENTRIES, PDFReportBuilder, StageProfiler, cache_hit_rates, create_api_session
+)
 
 warnings.filterwarnings('ignore')
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
-st.set_page_config(
-    page_title="Sistema de Análisis Presión Mancomunidad La Esperanza",
-    page_icon="💧",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+def configure_page():
+    st.set_page_config(
+        page_title="Sistema de Análisis Presión Mancomunidad La Esperanza",
+        page_icon="💧",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 # --- ESTILOS CSS PARA UN DISEÑO PROFESIONAL ---
-st.markdown("""
+PAGE_CSS = """
 <style>
     :root {
         --primary-color: #005f73; --secondary-color: #0a9396; --background-color: #f0f2f6;
@@ -55,268 +54,164 @@ st.markdown("""
         margin-top: 1rem; border: 1px solid #e0e0e0;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# --- CLASE PARA GENERACIÓN DE PDF ---
-class PDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, 'Reporte Técnico de Análisis de Presión', 0, 1, 'C')
-        self.set_font('Arial', '', 8)
-        self.cell(0, 5, f"Fecha de Generación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, 'Autor del Reporte: Ing. Leither Torres', 0, 0, 'L')
-        self.cell(0, 10, f'Página {self.page_no()}/{{nb}}', 0, 0, 'R')
-
-    def chapter_title(self, title):
-        self.set_font('Arial', 'B', 12)
-        self.set_fill_color(224, 235, 255)
-        self.cell(0, 8, title, 0, 1, 'L', 1)
-        self.ln(4)
-
-    def chapter_body(self, body):
-        safe_body = body.encode('latin-1', 'replace').decode('latin-1')
-        self.set_font('Arial', '', 10)
-        self.multi_cell(0, 5, safe_body)
-        self.ln()
-
-    def add_table(self, title, data, column_widths):
-        self.chapter_title(title)
-        self.set_font('Arial', 'B', 7)
-        for i, header in enumerate(data.columns):
-            self.cell(column_widths[i], 7, str(header), 1, 0, 'C')
-        self.ln()
-        self.set_font('Arial', '', 6)
-        for _, row in data.iterrows():
-            for i, item in enumerate(row):
-                self.cell(column_widths[i], 6, str(item), 1)
-            self.ln()
-        self.ln(5)
+"""
 
 # --- CONFIGURACIÓN DE LA API ---
 # Nota: La API Key se gestiona a través de los "Secrets" de Streamlit para mayor seguridad.
 # En local, crea un archivo .streamlit/secrets.toml y añade tu clave.
 OPENROUTER_API_KEY = st.secrets.get("OPENROUTER_API_KEY", "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")
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-# --- CLASE PRINCIPAL DE ANÁLISIS ---
-class WaterSystemPressureAnalyzer:
-    def __init__(self):
-        self.data = None
-        self.thresholds = {}
-
-    def set_thresholds(self, thresholds):
-        self.thresholds = thresholds
-
-    def detect_file_format(self, content):
-        lines = content.strip().split('\n')
-        if not lines: return None, None, None
-        first_line = lines[0]
-        separator = '\t'
-        if '\t' in first_line and len(first_line.split('\t')) > 1: separator = '\t'
-        elif ';' in first_line and len(first_line.split(';')) > 1: separator = ';'
-        elif ',' in first_line and len(first_line.split(',')) > 1: separator = ','
-        try:
-            first_column = first_line.split(separator)[0].strip()
-            has_header = not bool(re.match(r'^\d', first_column))
-        except IndexError: has_header = False
-        return separator, has_header, lines
-
-    def parse_datetime(self, date_str):
-        formats = ["%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M", "%d-%m-%Y %H:%M:%S"]
-        for fmt in formats:
-            try: return pd.to_datetime(date_str, format=fmt)
-            except (ValueError, TypeError): continue
-        try: return pd.to_datetime(date_str, dayfirst=True)
-        except (ValueError, TypeError): return None
-
-    def load_data(self, uploaded_file):
-        try:
-            content = uploaded_file.read().decode('utf-8', errors='ignore')
-            separator, has_header, _ = self.detect_file_format(content)
-            df = pd.read_csv(StringIO(content), sep=separator, header=0 if has_header else None, engine='python', skipinitialspace=True)
-
-            if df.shape[1] < 2:
-                st.error(f"❌ El archivo no tiene al menos 2 columnas. Verifique el separador."); return False
-
-            df = df.iloc[:, :2]
-            df.columns = ['timestamp_str', 'pressure']
-            
-            df.dropna(how='all', inplace=True)
-            if df.empty: st.error("❌ El archivo no contiene filas con datos."); return False
-            
-            df['pressure'] = df['pressure'].astype(str).str.replace(',', '.', regex=False)
-            df['pressure'] = pd.to_numeric(df['pressure'], errors='coerce')
-            df.dropna(subset=['pressure'], inplace=True)
-            if df.empty: st.error("❌ No se encontraron valores de presión numéricos válidos."); return False
-                
-            df['timestamp'] = df['timestamp_str'].astype(str).apply(self.parse_datetime)
-            if df['timestamp'].isnull().all(): st.error("❌ No se pudo interpretar ninguna fecha."); return False
-            df.dropna(subset=['timestamp'], inplace=True)
-            if df.empty: st.error("❌ No quedaron datos válidos tras procesar."); return False
-            
-            self.data = df[['timestamp', 'pressure']].sort_values('timestamp').reset_index(drop=True)
-            return True
-        except Exception as e:
-            st.error(f"❌ Error al procesar el archivo: {e}"); return False
-
-    def get_status(self, max_p):
-        if max_p >= self.thresholds['excelente']: return "Excelente"
-        if max_p >= self.thresholds['muy_bueno']: return "Muy Bueno"
-        if max_p >= self.thresholds['bueno']: return "Bueno"
-        if max_p >= self.thresholds['regular']: return "Regular"
-        if max_p >= self.thresholds['malo']: return "Malo"
-        if max_p >= self.thresholds['muy_malo']: return "Muy Malo (Rotura Probable)"
-        return "Suspensión de Servicio"
-
-    def analyze_daily_performance(self, data):
-        if data is None or data.empty: return pd.DataFrame()
-        data['date'] = data['timestamp'].dt.date
-        daily_summary = []
-        for date, group in data.groupby('date'):
-            max_p = group['pressure'].max()
-            status = self.get_status(max_p)
-            
-            pressure_started = group[group['pressure'] >= 3]
-            arrival_time = pressure_started['timestamp'].min() if not pressure_started.empty else None
-            
-            pressure_ended_mask = (group['timestamp'].dt.time > time(12, 0)) & (group['pressure'] < 1)
-            pressure_ended = group[pressure_ended_mask]
-            cut_time = pressure_ended['timestamp'].min() if not pressure_ended.empty else None
 
-            duration_hours = ((cut_time - arrival_time).total_seconds() / 3600) if pd.notnull(arrival_time) and pd.notnull(cut_time) else 0
-            
-            day_name_es = {'Monday': 'Lunes', 'Tuesday': 'Martes', 'Wednesday': 'Miércoles', 'Thursday': 'Jueves', 'Friday': 'Viernes', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
-            day_of_week = day_name_es[date.strftime('%A')]
-
-            daily_summary.append({
-                "Fecha": date.strftime('%d/%m/%Y'), "Día": day_of_week, "Estado": status,
-                "Presión Máx (PSI)": f"{max_p:.2f}",
-                "Hora Llegada": arrival_time.strftime('%H:%M') if pd.notnull(arrival_time) else "N/A",
-                "Hora Corte": cut_time.strftime('%H:%M') if pd.notnull(cut_time) else "N/A",
-                "Duración (H)": f"{duration_hours:.2f}"
-            })
-        return pd.DataFrame(daily_summary)
-
-# --- FUNCIONES DE VISUALIZACIÓN ---
-def create_time_series_chart(data, thresholds):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=data['timestamp'], y=data['pressure'], mode='lines', name='Presión', line=dict(color='#005f73', width=1.5)))
-    fig.add_hline(y=thresholds['excelente'], line_dash="dash", line_color="#2a9d8f", annotation_text=f"Excelente ≥ {thresholds['excelente']} PSI")
-    fig.add_hline(y=thresholds['sobrepresion'], line_dash="dot", line_color="#9b2226", annotation_text=f"Sobrepresión > {thresholds['sobrepresion']} PSI")
-    
-    if not data.empty:
-        fig.add_hrect(y0=0, y1=thresholds['muy_malo'], fillcolor="#e76f51", opacity=0.1, layer="below", line_width=0, annotation_text="Suspensión")
-        
-    fig.update_layout(title='<b>Análisis Temporal de Presión del Sistema</b>', xaxis_title='Fecha y Hora', yaxis_title='Presión (PSI)', height=500, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-    return fig
+# Formato compacto (centésimas de PSI en int16 y segundos desde 2000 en int32) para que varios años quepan en contenedores pequeños.
+DATA_STORAGE = "centipsi"
 
-def create_duration_chart(daily_summary):
-    if daily_summary.empty: return go.Figure()
-    summary = daily_summary.copy()
-    summary['Duración (H)'] = pd.to_numeric(summary['Duración (H)'])
-    
-    color_map = {
-        "Excelente": "#2a9d8f", "Muy Bueno": "#5fba7d", "Bueno": "#8acb88",
-        "Regular": "#e9c46a", "Malo": "#f4a261", "Muy Malo (Rotura Probable)": "#e76f51",
-        "Suspensión de Servicio": "#d00000"
-    }
-    
-    fig = px.bar(summary, x='Fecha', y='Duración (H)', title='<b>Duración Diaria del Servicio con Presión Adecuada</b>',
-                 labels={'Fecha': 'Día', 'Duración (H)': 'Horas de Servicio'},
-                 color='Estado', color_discrete_map=color_map)
-    fig.update_layout(xaxis={'type': 'category'})
-    return fig
-
-# --- FUNCIONES DE REPORTE ---
-def generate_ai_report(daily_summary, system_prompt):
+@st.cache_resource
+def get_data_cache():
+    return ParsedDataCache()
+
+@st.cache_resource
+def get_api_session():
+    return create_api_session()
+
+@st.cache_resource
+def get_ai_cache():
+    return LRUCache(AI_CACHE_MAX_ENTRIES)
+
+@st.cache_resource
+def get_pdf_builder():
+    return PDFReportBuilder()
+
+# Sondea la construcción del PDF sin volver a ejecutar toda la página; solo se dibuja mientras hay una construcción pendiente.
+@st.fragment(run_every=1)
+def pdf_job_poller():
+    job = st.session_state.get('pdf_job')
+    if job is None: return
+    if not job.done():
+        st.info("Creando PDF en segundo plano... puede seguir usando la aplicación."); return
     try:
-        user_content = f"Por favor, genera un reporte técnico en español basado en el siguiente resumen de rendimiento diario:\n\nTABLA DE RENDIMIENTO DIARIO:\n{daily_summary.to_string()}\n\nAnaliza esta tabla siguiendo las instrucciones del sistema."
-        response = requests.post(API_URL, headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"}, json={"model": "google/gemini-2.0-flash-exp:free", "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}]})
-        return response.json()['choices'][0]['message']['content'] if response.status_code == 200 else f"Error en la API: {response.status_code} - {response.text}"
+        st.session_state.pdf_report, st.session_state.pdf_charts = job.result()
+        st.session_state.pdf_ready = True
     except Exception as e:
-        return f"Error generando reporte: {e}"
-
-def generate_pdf_report(daily_summary, ai_report):
-    pdf = PDF('P', 'mm', 'A4')
-    pdf.alias_nb_pages()
-    pdf.add_page()
-    pdf.set_font('Arial', 'B', 18)
-    pdf.cell(0, 15, 'Reporte Técnico de Análisis de Presión', 0, 1, 'C'); pdf.ln(5)
-    
-    body_text = ai_report.replace('**', '').replace('##', '')
-    lines = body_text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        if re.match(r'^\d+\.\s+[A-Z\s]+:', line):
-            pdf.chapter_title(line.replace(':', ''))
-        else:
-            pdf.set_font('Arial', '', 10)
-            pdf.multi_cell(0, 5, line.encode('latin-1', 'replace').decode('latin-1')); pdf.ln(1)
-            
-    pdf.add_page(orientation='L')
-    column_widths = [25, 25, 40, 30, 30, 30, 30]
-    pdf.add_table("Tabla de Rendimiento Diario Detallado", daily_summary, column_widths)
-    return bytes(pdf.output())
+        st.session_state.pdf_error = f"No se pudo crear el PDF: {e}"
+    st.session_state.pdf_job = None
+    st.rerun()
+
+def pdf_download_panel():
+    if st.session_state.get('pdf_job') is not None: pdf_job_poller()
+    if st.session_state.get('pdf_error'): st.error(st.session_state.pdf_error)
+    if st.session_state.get('pdf_ready'):
+        if not st.session_state.get('pdf_charts'):
+            st.caption("ℹ️ El PDF no incluye los gráficos: exportarlos como imagen requiere kaleido (y Chrome) en el servidor.")
+        st.download_button(label="✅ PDF Listo. ¡Descargar Aquí!", data=st.session_state.pdf_report, file_name=f"Reporte_Tecnico_Presion_{datetime.now().strftime('%Y%m%d')}.pdf", mime="application/pdf", use_container_width=True)
+
+def profiling_panel():
+    with st.sidebar:
+        st.markdown("---")
+        if not st.checkbox("🔬 Mostrar perfil de rendimiento", help="Tiempos por etapa y tasas de acierto de las cachés en esta sesión."): return
+        st.dataframe(st.session_state.profiler.summary(), hide_index=True, use_container_width=True)
+        memo = st.session_state.analysis_memo
+        st.dataframe(cache_hit_rates({
+            "Agregados diarios": memo.aggregates, "Vistas y gráficos": memo.views, "Datos procesados (disco, compartida)": get_data_cache(),
+            "Reportes IA (compartida)": get_ai_cache(), "PDF (compartida)": get_pdf_builder().cache
+        }), hide_index=True, use_container_width=True)
+        if st.button("Reiniciar mediciones", use_container_width=True): st.session_state.profiler.clear(); st.rerun()
 
 # --- APLICACIÓN PRINCIPAL ---
 def main():
+    configure_page()
     st.markdown("""<div class="main-header"><h1>Sistema de Análisis Presión Mancomunidad La Esperanza</h1><h3>diagnostico del tramo 3, El Vergel - Cambio</h3></div>""", unsafe_allow_html=True)
     
     if 'analyzer' not in st.session_state:
-        st.session_state.analyzer = WaterSystemPressureAnalyzer()
+        st.session_state.analyzer = WaterSystemPressureAnalyzer(cache=get_data_cache(), storage=DATA_STORAGE)
+    if 'profiler' not in st.session_state:
+        st.session_state.profiler = StageProfiler()
+    st.session_state.analyzer.profiler = st.session_state.profiler
+    if 'analysis_memo' not in st.session_state:
+        st.session_state.analysis_memo = AnalysisMemo(profiler=st.session_state.profiler)
 
     with st.sidebar:
         st.header("⚙️ Panel de Control")
         thresholds = {
-            "excelente": st.number_input("Excelente ≥ (PSI)", min_value=10.0, max_value=50.0, value=18.0, step=0.5),
-            "muy_bueno": st.number_input("Muy Bueno ≥ (PSI)", min_value=10.0, max_value=50.0, value=17.5, step=0.5),
-            "bueno": st.number_input("Bueno ≥ (PSI)", min_value=10.0, max_value=50.0, value=16.5, step=0.5),
-            "regular": st.number_input("Regular ≥ (PSI)", min_value=5.0, max_value=49.0, value=15.0, step=0.5),
-            "malo": st.number_input("Malo ≥ (PSI)", min_value=5.0, max_value=49.0, value=10.0, step=0.5),
-            "muy_malo": st.number_input("Muy Malo ≥ (PSI)", min_value=0.0, max_value=49.0, value=5.0, step=0.5),
-            "sobrepresion": st.number_input("Alerta Sobrepresión > (PSI)", min_value=20.0, max_value=60.0, value=25.0, step=1.0)
+            "excelente": st.number_input("Excelente ≥ (PSI)", min_value=10.0, max_value=50.0, value=DEFAULT_THRESHOLDS["excelente"], step=0.5),
+            "muy_bueno": st.number_input("Muy Bueno ≥ (PSI)", min_value=10.0, max_value=50.0, value=DEFAULT_THRESHOLDS["muy_bueno"], step=0.5),
+            "bueno": st.number_input("Bueno ≥ (PSI)", min_value=10.0, max_value=50.0, value=DEFAULT_THRESHOLDS["bueno"], step=0.5),
+            "regular": st.number_input("Regular ≥ (PSI)", min_value=5.0, max_value=49.0, value=DEFAULT_THRESHOLDS["regular"], step=0.5),
+            "malo": st.number_input("Malo ≥ (PSI)", min_value=5.0, max_value=49.0, value=DEFAULT_THRESHOLDS["malo"], step=0.5),
+            "muy_malo": st.number_input("Muy Malo ≥ (PSI)", min_value=0.0, max_value=49.0, value=DEFAULT_THRESHOLDS["muy_malo"], step=0.5),
+            "sobrepresion": st.number_input("Alerta Sobrepresión > (PSI)", min_value=20.0, max_value=60.0, value=DEFAULT_THRESHOLDS["sobrepresion"], step=1.0)
         }
         st.session_state.analyzer.set_thresholds(thresholds)
+
+        with st.expander("⏱️ Detección de Eventos de Servicio"):
+            event_settings = {
+                "encendido_psi": st.number_input("Inicio de servicio ≥ (PSI)", min_value=0.5, max_value=20.0, value=DEFAULT_EVENT_SETTINGS["encendido_psi"], step=0.5),
+                "apagado_psi": st.number_input("Corte de servicio < (PSI)", min_value=0.0, max_value=20.0, value=DEFAULT_EVENT_SETTINGS["apagado_psi"], step=0.5),
+                "min_servicio_min": st.number_input("Duración mínima de un servicio (min)", min_value=0, max_value=240, value=DEFAULT_EVENT_SETTINGS["min_servicio_min"], step=5),
+                "min_corte_min": st.number_input("Duración mínima de una interrupción (min)", min_value=0, max_value=240, value=DEFAULT_EVENT_SETTINGS["min_corte_min"], step=5),
+                "max_hueco_min": st.number_input("Hueco máximo entre lecturas (min)", min_value=1, max_value=1440, value=DEFAULT_EVENT_SETTINGS["max_hueco_min"], step=5, help="Un hueco mayor cierra el episodio de servicio: el tiempo sin lecturas no se cuenta como servicio.")
+            }
+            if event_settings["apagado_psi"] > event_settings["encendido_psi"]: st.warning("El umbral de corte no puede superar al de inicio.")
+            else: st.session_state.analyzer.set_event_settings(event_settings)
         
         st.markdown("---")
-        uploaded_file = st.file_uploader("📁 Cargar Archivo de Datos (.csv, .txt)", type=['csv', 'txt'])
+        uploaded_files = st.file_uploader("📁 Cargar Archivos de Datos (.csv, .txt)", type=['csv', 'txt'], accept_multiple_files=True, help="Cada archivo, y cada columna de presión dentro de él, se analiza como una estación.")
+        append_mode = st.session_state.analyzer.data is not None and st.checkbox("➕ Añadir a los datos ya cargados", help="Fusiona las lecturas nuevas con las existentes, elimina duplicados y recalcula solo los días modificados.")
 
-        if uploaded_file and st.button("🚀 Procesar Datos", type="primary", use_container_width=True):
+        if uploaded_files and st.button("🚀 Procesar Datos", type="primary", use_container_width=True):
             with st.spinner('Analizando archivo...'):
-                for key in ['ai_report', 'pdf_report', 'pdf_ready', 'date_range']:
+                for key in ['ai_report', 'pdf_report', 'pdf_ready', 'pdf_job', 'pdf_error', 'date_range']:
                     if key in st.session_state: del st.session_state[key]
-                if st.session_state.analyzer.load_data(uploaded_file):
-                    st.session_state.date_range = (st.session_state.analyzer.data['timestamp'].min().date(), st.session_state.analyzer.data['timestamp'].max().date())
+                loader = st.session_state.analyzer.append_data if append_mode else st.session_state.analyzer.load_data
+                if loader(uploaded_files):
+                    st.session_state.date_range = st.session_state.analyzer.date_bounds()
                     st.success("✅ Datos procesados con éxito."); st.rerun()
+                else: st.error(st.session_state.analyzer.last_error)
 
     if st.session_state.analyzer.data is None:
         st.info("👈 Cargue un archivo de datos para comenzar el análisis."); return
 
+    stations = st.session_state.analyzer.stations
     with st.sidebar:
+        station = stations[0]
+        if len(stations) > 1:
+            st.markdown("---"); st.header("📍 Estación")
+            station = st.selectbox("Estación a analizar:", stations)
+
         st.markdown("---"); st.header("📅 Filtro por Fecha")
         if 'date_range' in st.session_state:
             min_date, max_date = st.session_state.date_range
             selected_range = st.date_input("Seleccione el rango:", value=(min_date, max_date), min_value=min_date, max_value=max_date)
             start_date, end_date = (selected_range[0], selected_range[1]) if len(selected_range) == 2 else (min_date, max_date)
-            mask = (st.session_state.analyzer.data['timestamp'].dt.date >= start_date) & (st.session_state.analyzer.data['timestamp'].dt.date <= end_date)
-            filtered_data = st.session_state.analyzer.data.loc[mask]
-        else: filtered_data = st.session_state.analyzer.data
+            date_key = (start_date, end_date)
+            filtered_data, _ = st.session_state.analyzer.slice_by_date(start_date, end_date, station)
+        else:
+            date_key = (None, None)
+            filtered_data, _ = st.session_state.analyzer.slice_by_date(None, None, station)
+
+        if st.session_state.analyzer.parse_report:
+            with st.expander("🕒 Formatos de fecha detectados"):
+                if st.session_state.analyzer.loaded_from_cache: st.caption("Datos recuperados de la caché local.")
+                for fmt, count in st.session_state.analyzer.parse_report.items():
+                    st.write(f"`{fmt}`: {count:,} filas")
+                memory = st.session_state.analyzer.memory_report()
+                st.caption(f"💾 Memoria de las lecturas: {memory['bytes'] / 2**20:.1f} MB en formato `{memory['storage']}` (frente a {memory['standard_bytes'] / 2**20:.1f} MB en float64).")
+        if st.session_state.analyzer.last_update:
+            st.caption(f"🔄 Actualización incremental: {st.session_state.analyzer.last_update['rows']:,} lecturas leídas, {st.session_state.analyzer.last_update['days']} días recalculados.")
+
+        st.markdown("---"); st.header("📈 Opciones del Gráfico")
+        chart_options = {
+            "max_points": int(st.number_input("Puntos máximos a dibujar", min_value=500, max_value=200000, value=CHART_MAX_POINTS, step=500)),
+            "use_webgl": st.checkbox("Renderizar con WebGL", value=True)
+        }
 
     if filtered_data.empty:
         st.warning("⚠️ No hay datos para el rango de fechas seleccionado."); return
 
-    daily_summary_df = st.session_state.analyzer.analyze_daily_performance(filtered_data)
+    view = st.session_state.analysis_memo.daily_view(st.session_state.analyzer, station, filtered_data, date_key, thresholds, chart_options)
+    daily_summary_df = view['daily_summary']
     
-    st.subheader("📊 Resumen de Rendimiento por Día")
+    st.subheader(f"📊 Resumen de Rendimiento por Día — {station}" if len(stations) > 1 else "📊 Resumen de Rendimiento por Día")
     if not daily_summary_df.empty:
-        status_counts = daily_summary_df['Estado'].value_counts()
-        dias_sobrepresion = daily_summary_df[pd.to_numeric(daily_summary_df['Presión Máx (PSI)']) > thresholds['sobrepresion']].shape[0]
+        status_counts, dias_sobrepresion = view['status_counts'], view['dias_sobrepresion']
 
         cols = st.columns(3)
         cols[0].metric("✅ Días con Buen Servicio (Bueno o Superior)", status_counts.get("Excelente", 0) + status_counts.get("Muy Bueno", 0) + status_counts.get("Bueno", 0))
@@ -327,14 +222,12 @@ def main():
             st.markdown(f"<div class='alert alert-high-pressure'><b>ALERTA DE SOBREPRESIÓN:</b> Se detectaron {dias_sobrepresion} días con presiones superiores a {thresholds['sobrepresion']} PSI. Esto puede causar daños en la red y en las instalaciones de los usuarios.</div>", unsafe_allow_html=True)
 
     st.markdown("---")
-    tab_dashboard, tab_report = st.tabs(["📈 Dashboard Interactivo", "📋 Generador de Reportes"])
+    tabs = st.tabs(["📈 Dashboard Interactivo", "📋 Generador de Reportes"] + (["🗺️ Comparación de Estaciones"] if len(stations) > 1 else []))
+    tab_dashboard, tab_report = tabs[:2]
     
     with tab_dashboard:
-        fig_time = create_time_series_chart(filtered_data, thresholds)
-        st.plotly_chart(fig_time, use_container_width=True)
-        
-        fig_duration = create_duration_chart(daily_summary_df)
-        st.plotly_chart(fig_duration, use_container_width=True)
+        st.plotly_chart(view['fig_time'], use_container_width=True)
+        st.plotly_chart(view['fig_duration'], use_container_width=True)
 
         st.dataframe(daily_summary_df, use_container_width=True)
 
@@ -348,28 +241,37 @@ El reporte debe estar estructurado en las siguientes secciones:
 1.  **ASUNTO:** Análisis de Comportamiento de Presiones en el Tramo 3: El Vergel - Cambio.
 2.  **RESUMEN EJECUTIVO:** Síntesis de los hallazgos más importantes, el estado general del sistema y las conclusiones principales.
 3.  **ANÁLISIS DE COMPORTAMIENTO DIARIO:** Evalúa el rendimiento general basándote en la clasificación de los días (Excelente, Bueno, Malo, etc.). Identifica patrones, como la recurrencia de días deficientes en ciertas fechas o días de la semana.
-4.  **ANÁLISIS DE HORARIOS DE SERVICIO:** Comenta sobre la consistencia de la 'Hora de Llegada' y la 'Duración del Servicio'. Compara los horarios reales con el horario operativo esperado (05:30 - 18:00). ¿Son estables los horarios o hay variabilidad? ¿Cómo afecta esto al abastecimiento?
+4.  **ANÁLISIS DE HORARIOS DE SERVICIO:** Comenta sobre la consistencia de la 'Hora de Llegada', la 'Duración del Servicio' y las 'Interrupciones' dentro de cada día. Compara los horarios reales con el horario operativo esperado (05:30 - 18:00). ¿Son estables los horarios o hay variabilidad? ¿Cómo afecta esto al abastecimiento?
 5.  **DIAGNÓSTICO DE DÍAS CRÍTICOS Y ANOMALÍAS:** Enfócate en los días clasificados como 'Malo', 'Muy Malo' o 'Suspensión'. Analiza sus presiones máximas y duraciones de servicio para determinar la severidad del problema. Menciona cualquier día con sobrepresión.
 6.  **CONCLUSIONES Y RECOMENDACIONES:** Finaliza con conclusiones claras y un plan de acción con recomendaciones priorizadas (Alta, Media, Baja) para corregir las deficiencias encontradas."""
         
         custom_prompt = st.text_area("Edite las instrucciones para la IA si es necesario:", value=default_system_prompt, height=300)
 
         if st.button("Generar Diagnóstico con IA", use_container_width=True) and not daily_summary_df.empty:
-            with st.spinner("La IA está analizando los datos y redactando el informe..."):
-                st.session_state.ai_report = generate_ai_report(daily_summary_df, custom_prompt)
+            job = AIReportJob(daily_summary_df, custom_prompt, OPENROUTER_API_KEY, cache=get_ai_cache(), session=get_api_session())
+            stream_area = st.empty()
+            with stream_area.container():
+                st.caption("La IA está analizando los datos y redactando el informe..." if not job.from_cache else "Reporte recuperado de la caché.")
+                st.session_state.ai_report = st.write_stream(job.iter_chunks())
+            stream_area.empty()
         
         if 'ai_report' in st.session_state and st.session_state.ai_report:
             st.markdown("<div class='technical-section'>", unsafe_allow_html=True); st.markdown(st.session_state.ai_report); st.markdown("</div>", unsafe_allow_html=True)
             st.markdown("---"); st.subheader("📄 Exportar Reporte Profesional en PDF")
 
             if st.button("📥 Crear PDF para Descargar", type="primary", use_container_width=True):
-                with st.spinner("Creando PDF..."):
-                    pdf_bytes = generate_pdf_report(daily_summary_df, st.session_state.ai_report)
-                    st.session_state.pdf_report = pdf_bytes
-                    st.session_state.pdf_ready = True
+                st.session_state.pdf_ready, st.session_state.pdf_error = False, None
+                st.session_state.pdf_job = get_pdf_builder().submit(daily_summary_df, st.session_state.ai_report, [view['fig_time'], view['fig_duration']], profiler=st.session_state.profiler)
             
-            if 'pdf_ready' in st.session_state and st.session_state.pdf_ready:
-                st.download_button(label="✅ PDF Listo. ¡Descargar Aquí!", data=st.session_state.pdf_report, file_name=f"Reporte_Tecnico_Presion_{datetime.now().strftime('%Y%m%d')}.pdf", mime="application/pdf", use_container_width=True)
+            pdf_download_panel()
+
+    if len(stations) > 1:
+        with tabs[2]:
+            comparison = st.session_state.analysis_memo.comparison_view(st.session_state.analyzer, date_key, thresholds)
+            st.plotly_chart(comparison['fig_comparison'], use_container_width=True)
+            st.dataframe(comparison['station_summary'], use_container_width=True)
+
+    profiling_panel()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Generador de archivos sintéticos de registradores: ciclos diarios de servicio con formatos "sucios" (comas decimales,
+# fechas en varios formatos, valores inválidos) y huecos, para pruebas de rendimiento sin datos reales.
+# Uso: python generar_datos.py carpeta --tamano anio --estaciones 3
+
+SIZES = {"semana": 7, "mes": 30, "anio": 365, "cinco_anios": 1826}
+START_DATE = "2020-01-01"
+SERVICE_START_MIN, SERVICE_END_MIN = 330, 1080  # 05:30 y 18:00
+ALT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+ALT_FORMAT_RATE = 0.02
+INVALID_RATE = 0.001
+DROPPED_READING_RATE = 0.005
+OUTAGES_PER_MONTH = 2
+
+def generate_pressure_series(days, seed=0, start=START_DATE):
+    # Un día por fila: llegada hacia las 05:30, corte hacia las 18:00, caída de demanda por la tarde,
+    # interrupciones ocasionales, días de suspensión y algunos picos de sobrepresión.
+    rng = np.random.default_rng(seed)
+    minute = np.arange(1440)[None, :]
+    arrival = rng.normal(SERVICE_START_MIN, 20, (days, 1))
+    cut = rng.normal(SERVICE_END_MIN, 30, (days, 1))
+    plateau = rng.normal(18, 2, (days, 1)) + np.where(rng.random((days, 1)) < 0.02, 10, 0)
+    interruption_start = rng.uniform(arrival, cut)
+    interruption_end = interruption_start + np.where(rng.random((days, 1)) < 0.08, rng.uniform(20, 120, (days, 1)), 0)
+    suspended = rng.random((days, 1)) < 0.03
+
+    on = (minute >= arrival) & (minute < cut) & ~suspended & ~((minute >= interruption_start) & (minute < interruption_end))
+    demand = 2.5 * np.clip(np.sin((minute - 720) / 360 * np.pi), 0, None)
+    ramp = 1 - np.exp(-np.clip(minute - arrival, 0, None) / 15)
+    pressure = np.where(on, plateau * ramp - demand, 0.1) + rng.normal(0, 0.3, (days, 1440))
+    timestamps = pd.date_range(start, periods=days * 1440, freq="min")
+    return timestamps, np.round(pressure.ravel(), 2)
+
+def format_logger_lines(timestamps, pressure, seed=0, dirty=True):
+    rng = np.random.default_rng(seed + 1)
+    n = len(timestamps)
+    keep = np.ones(n, dtype=bool)
+    if dirty:
+        # Lecturas perdidas sueltas y cortes del registrador de 1 a 12 horas.
+        keep &= rng.random(n) >= DROPPED_READING_RATE
+        for start in rng.integers(0, n, max(1, n * OUTAGES_PER_MONTH // (30 * 1440))):
+            keep[start:start + rng.integers(60, 720)] = False
+    timestamps, pressure = timestamps[keep], pressure[keep]
+    n = len(timestamps)
+
+    # strftime fila a fila es lento en series de años: se combinan las etiquetas de cada día y de cada minuto.
+    minutes = np.asarray((timestamps - timestamps[0].normalize()) // pd.Timedelta(minutes=1))
+    day_labels = pd.date_range(timestamps[0].normalize(), timestamps[-1].normalize()).strftime("%d/%m/%Y").to_numpy(dtype=object)
+    clock_labels = pd.date_range("2000-01-01", periods=1440, freq="min").strftime(" %H:%M").to_numpy(dtype=object)
+    dates = pd.Series(day_labels[minutes // 1440] + clock_labels[minutes % 1440])
+    values = pd.Series(pressure).map("{:.2f}".format)
+    if dirty:
+        alternate = rng.random(n) < ALT_FORMAT_RATE
+        dates[alternate] = timestamps[alternate].strftime(ALT_DATETIME_FORMAT)
+        padded = rng.random(n) < ALT_FORMAT_RATE
+        dates[padded] = " " + dates[padded] + " "
+        values = values.str.replace(".", ",", regex=False)
+        invalid = rng.random(n) < INVALID_RATE
+        values[invalid] = rng.choice(["ERR", "", "--"], invalid.sum())
+    return dates + ";" + values
+
+def generate_logger_file(path, days, seed=0, dirty=True, start=START_DATE):
+    timestamps, pressure = generate_pressure_series(days, seed, start)
+    lines = format_logger_lines(timestamps, pressure, seed, dirty)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("Fecha y Hora;Presión (PSI)\n")
+        f.write("\n".join(lines))
+        f.write("\n")
+    return len(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera archivos sintéticos de registradores de presión (1 lectura por minuto).")
+    parser.add_argument("directorio", help="Carpeta donde se escriben los archivos")
+    parser.add_argument("--tamano", choices=SIZES, default="mes", help="Periodo a generar")
+    parser.add_argument("--dias", type=int, help="Número de días (sustituye a --tamano)")
+    parser.add_argument("--estaciones", type=int, default=1, help="Número de archivos (una estación por archivo)")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla aleatoria")
+    parser.add_argument("--limpio", action="store_true", help="Sin huecos, formatos alternativos ni valores inválidos")
+    args = parser.parse_args(argv)
+
+    days = args.dias or SIZES[args.tamano]
+    os.makedirs(args.directorio, exist_ok=True)
+    for i in range(1, args.estaciones + 1):
+        path = os.path.join(args.directorio, f"Estacion_{i}.csv")
+        rows = generate_logger_file(path, days, seed=args.semilla + i, dirty=not args.limpio)
+        print(f"{path}: {rows:,} filas ({days} días)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from analisis_presion import (
+    WaterSystemPressureAnalyzer, DEFAULT_THRESHOLDS, STORAGE_MODES,
+    create_time_series_chart, create_duration_chart, generate_pdf_report
+)
+from generar_datos import SIZES, generate_logger_file
+
+# Mide cada etapa del análisis sobre datos sintéticos de distintos tamaños y guarda resultados comparables entre versiones.
+# Uso: python medir_rendimiento.py --tamanos semana mes anio --salida rendimiento.csv --comparar rendimiento_anterior.csv
+
+STAGES = ['load_data', 'parse_timestamps', 'analyze_daily_performance', 'create_time_series_chart', 'create_duration_chart', 'generate_pdf_report']
+RESULT_KEYS = ['tamano', 'almacenamiento', 'etapa']
+BENCHMARK_REPORT_TEXT = "1. RESUMEN AUTOMATICO:\nReporte de referencia para la medición de rendimiento."
+
+def measure(func, repeats):
+    # El tiempo es el mejor de varias ejecuciones sin tracemalloc; el pico de memoria sale de una ejecución aparte.
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak
+
+def benchmark_file(path, storage, repeats):
+    analyzer = WaterSystemPressureAnalyzer(storage=storage)
+    analyzer.set_thresholds(DEFAULT_THRESHOLDS)
+    if not analyzer.load_data(path): raise RuntimeError(analyzer.last_error)
+    raw_timestamps = pd.read_csv(path, sep=';', usecols=[0], dtype=str).iloc[:, 0].dropna()
+    summary = analyzer.analyze_daily_performance(analyzer.data)
+    stages = {
+        'load_data': lambda: WaterSystemPressureAnalyzer(storage=storage).load_data(path),
+        'parse_timestamps': lambda: analyzer.parse_timestamps(raw_timestamps),
+        'analyze_daily_performance': lambda: analyzer.analyze_daily_performance(analyzer.data),
+        'create_time_series_chart': lambda: create_time_series_chart(analyzer.data, DEFAULT_THRESHOLDS, events=analyzer.events),
+        'create_duration_chart': lambda: create_duration_chart(summary),
+        'generate_pdf_report': lambda: generate_pdf_report(summary, BENCHMARK_REPORT_TEXT)
+    }
+    for stage in STAGES:
+        seconds, peak = measure(stages[stage], repeats)
+        yield {'etapa': stage, 'filas': len(analyzer.data), 'segundos': round(seconds, 4), 'pico_mb': round(peak / 2**20, 2)}
+
+def compare(results, previous_path):
+    previous = pd.read_csv(previous_path)
+    merged = results.merge(previous, on=RESULT_KEYS, how='inner', suffixes=('', '_anterior'))
+    merged['aceleracion'] = (merged['segundos_anterior'] / merged['segundos']).round(2)
+    merged['memoria_relativa'] = (merged['pico_mb'] / merged['pico_mb_anterior']).round(2)
+    return merged[RESULT_KEYS + ['segundos_anterior', 'segundos', 'aceleracion', 'pico_mb_anterior', 'pico_mb', 'memoria_relativa']]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide tiempo y pico de memoria de cada etapa del análisis de presiones.")
+    parser.add_argument('--tamanos', nargs='+', choices=SIZES, default=['semana', 'mes', 'anio'], help="Periodos sintéticos a medir (1 lectura por minuto)")
+    parser.add_argument('--almacenamiento', choices=STORAGE_MODES, default='standard', help="Representación de las lecturas en memoria")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Ejecuciones por etapa; se conserva la más rápida")
+    parser.add_argument('--datos', default='datos_sinteticos', help="Carpeta de los archivos sintéticos (se reutilizan si existen)")
+    parser.add_argument('--salida', default='rendimiento.csv', help="Archivo CSV de resultados")
+    parser.add_argument('--comparar', metavar='CSV', help="Resultados anteriores con los que comparar")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.datos, exist_ok=True)
+    rows = []
+    for size in args.tamanos:
+        path = os.path.join(args.datos, f"sintetico_{size}_s{args.semilla}.csv")
+        if not os.path.exists(path): generate_logger_file(path, SIZES[size], seed=args.semilla)
+        for result in benchmark_file(path, args.almacenamiento, max(1, args.repeticiones)):
+            rows.append({'tamano': size, 'almacenamiento': args.almacenamiento, **result})
+            print(f"{size:>12} {result['etapa']:<27} {result['segundos']:>9.4f} s {result['pico_mb']:>9.2f} MB")
+
+    results = pd.DataFrame(rows).assign(fecha=datetime.now().isoformat(timespec='seconds'))
+    results.to_csv(args.salida, index=False)
+    print(f"\nResultados guardados en {args.salida} (pico de memoria: asignaciones de Python/NumPy según tracemalloc)")
+    if args.comparar:
+        print(compare(results, args.comparar).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analisis_presion import WaterSystemPressureAnalyzer, ParsedDataCache, DEFAULT_THRESHOLDS, DEFAULT_EVENT_SETTINGS, CACHE_DIR, STORAGE_MODES, generate_pdf_report
+
+# Procesamiento nocturno por lotes: cada archivo de registrador es una estación y se analiza en un proceso aparte.
+# Uso: python procesar_lote.py carpeta_registradores --salida resultados --procesos 4
+
+FILE_PATTERNS = ('*.csv', '*.txt')
+
+def station_report_text(station, daily_metrics, thresholds):
+    counts = daily_metrics['status'].value_counts()
+    good_days = sum(counts.get(status, 0) for status in ("Excelente", "Muy Bueno", "Bueno"))
+    overpressure_days = int((daily_metrics['max_pressure'] > thresholds['sobrepresion']).sum())
+    return "\n".join([
+        "1. RESUMEN AUTOMATICO:",
+        f"Estación: {station}",
+        f"Periodo analizado: {daily_metrics['date'].min():%d/%m/%Y} - {daily_metrics['date'].max():%d/%m/%Y} ({len(daily_metrics)} días)",
+        f"Días con buen servicio (Bueno o superior): {good_days}",
+        f"Días con mal servicio (Regular o inferior): {len(daily_metrics) - good_days}",
+        f"Días con sobrepresión (> {thresholds['sobrepresion']} PSI): {overpressure_days}",
+        f"Duración media del servicio: {daily_metrics['duration_hours'].mean():.2f} h",
+        f"Interrupciones de servicio dentro del día: {int((daily_metrics['service_windows'] - 1).clip(lower=0).sum())}",
+        f"Presión máxima registrada: {daily_metrics['max_pressure'].max():.2f} PSI"
+    ])
+
+def station_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def failed_result(station, error, seconds=0.0):
+    return {'station': station, 'rows': 0, 'days': 0, 'bytes': 0, 'standard_bytes': 0, 'error': error, 'seconds': seconds}
+
+def analyze_station(path, output_dir, thresholds, write_pdf, cache_dir, storage='standard', event_settings=None):
+    started = time.perf_counter()
+    station = station_name(path)
+    analyzer = WaterSystemPressureAnalyzer(cache=ParsedDataCache(cache_dir) if cache_dir else None, storage=storage, event_settings=event_settings)
+    analyzer.set_thresholds(thresholds)
+    if not analyzer.load_data(path):
+        return failed_result(station, analyzer.last_error, time.perf_counter() - started)
+
+    daily_metrics = analyzer.classify_daily(analyzer.daily_metrics)
+    daily_summary = analyzer.format_daily_summary(daily_metrics)
+    daily_summary.to_csv(os.path.join(output_dir, f"{station}_resumen_diario.csv"), index=False, encoding='utf-8-sig')
+    if write_pdf:
+        with open(os.path.join(output_dir, f"{station}_reporte.pdf"), 'wb') as f:
+            f.write(generate_pdf_report(daily_summary, station_report_text(station, daily_metrics, thresholds)))
+    memory = analyzer.memory_report()
+    return {'station': station, 'rows': memory['rows'], 'days': len(daily_metrics), 'bytes': memory['bytes'], 'standard_bytes': memory['standard_bytes'],
+            'error': None, 'seconds': time.perf_counter() - started}
+
+def parse_thresholds(overrides, defaults=DEFAULT_THRESHOLDS):
+    thresholds = dict(defaults)
+    for item in overrides or []:
+        key, _, value = item.partition('=')
+        if key not in thresholds: raise argparse.ArgumentTypeError(f"Parámetro desconocido: {key}")
+        thresholds[key] = float(value)
+    return thresholds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análisis por lotes de archivos de registradores de presión.")
+    parser.add_argument('directorio', help="Carpeta con los archivos .csv/.txt de los registradores")
+    parser.add_argument('--salida', help="Carpeta de resultados (por defecto <directorio>/resultados)")
+    parser.add_argument('--procesos', type=int, default=os.cpu_count(), help="Número de procesos en paralelo")
+    parser.add_argument('--umbral', action='append', metavar='CLAVE=VALOR', help=f"Sobrescribe un umbral ({', '.join(DEFAULT_THRESHOLDS)})")
+    parser.add_argument('--evento', action='append', metavar='CLAVE=VALOR', help=f"Sobrescribe un parámetro de detección de eventos ({', '.join(DEFAULT_EVENT_SETTINGS)})")
+    parser.add_argument('--sin-pdf', action='store_true', help="No generar el reporte PDF de cada estación")
+    parser.add_argument('--sin-cache', action='store_true', help="No usar la caché de datos procesados")
+    parser.add_argument('--almacenamiento', choices=STORAGE_MODES, default='standard', help="Representación de las lecturas en memoria (centipsi es la más compacta)")
+    args = parser.parse_args(argv)
+
+    try: thresholds, event_settings = parse_thresholds(args.umbral), parse_thresholds(args.evento, DEFAULT_EVENT_SETTINGS)
+    except (argparse.ArgumentTypeError, ValueError) as e: parser.error(str(e))
+    paths = sorted(p for pattern in FILE_PATTERNS for p in glob.glob(os.path.join(args.directorio, pattern)))
+    if not paths: parser.error(f"No se encontraron archivos {'/'.join(FILE_PATTERNS)} en {args.directorio}")
+    output_dir = args.salida or os.path.join(args.directorio, 'resultados')
+    os.makedirs(output_dir, exist_ok=True)
+    cache_dir = None if args.sin_cache else CACHE_DIR
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, args.procesos)) as pool:
+        futures = {pool.submit(analyze_station, path, output_dir, thresholds, not args.sin_pdf, cache_dir, args.almacenamiento, event_settings): path for path in paths}
+        for future in as_completed(futures):
+            # Un fallo inesperado en un archivo (análisis, PDF, E/S) se informa como error sin detener el lote.
+            try: result = future.result()
+            except Exception as e: result = failed_result(station_name(futures[future]), f"❌ Error inesperado: {type(e).__name__}: {e}")
+            results.append(result)
+            if result['error']: print(f"[ERROR] {result['station']}: {result['error']}")
+            else: print(f"[OK] {result['station']}: {result['rows']:,} filas, {result['days']} días, {result['bytes'] / 2**20:.1f} MB ({result['seconds']:.2f} s)")
+    elapsed = time.perf_counter() - started
+
+    total_rows = sum(r['rows'] for r in results)
+    failed = sum(1 for r in results if r['error'])
+    print(f"\n{len(results)} archivos ({failed} con error), {total_rows:,} filas en {elapsed:.2f} s")
+    print(f"Rendimiento: {len(results) / elapsed:.2f} archivos/s, {total_rows / elapsed:,.0f} filas/s")
+    print(f"Memoria de las lecturas ({args.almacenamiento}): {sum(r['bytes'] for r in results) / 2**20:.1f} MB (float64: {sum(r['standard_bytes'] for r in results) / 2**20:.1f} MB)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from analisis_presion import WaterSystemPressureAnalyzer, STORAGE_MODES
+
+def write_logger(path, offset, periods=100):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    timestamps = pd.date_range("2024-01-01", periods=periods, freq="min")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Fecha y Hora;Presión (PSI)\n")
+        f.write("".join(f"{t:%d/%m/%Y %H:%M};{10 + offset + i % 5:.2f}\n" for i, t in enumerate(timestamps)))
+    return str(path)
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_archivos_con_el_mismo_nombre(tmp_path, storage):
+    # Dos carpetas con un "dup.csv" cada una son la misma estación: cargarlas juntas equivale a cargar y agregar.
+    first, second = write_logger(tmp_path / "x" / "dup.csv", 0), write_logger(tmp_path / "y" / "dup.csv", 1)
+    together = WaterSystemPressureAnalyzer(storage=storage)
+    assert together.load_data([first, second]), together.last_error
+    appended = WaterSystemPressureAnalyzer(storage=storage)
+    assert appended.load_data(first) and appended.append_data(second)
+    assert together.stations == ["dup"]
+    assert len(together.data) == 100 and not together.data['timestamp'].duplicated().any()
+    pd.testing.assert_frame_equal(together.data, appended.data)
+    pd.testing.assert_frame_equal(together.daily_metrics, appended.daily_metrics)
+
+def test_mismo_archivo_dos_veces(tmp_path):
+    path = write_logger(tmp_path / "dup.csv", 0)
+    twice, once = WaterSystemPressureAnalyzer(), WaterSystemPressureAnalyzer()
+    assert twice.load_data([path, path]) and once.load_data(path)
+    pd.testing.assert_frame_equal(twice.data, once.data)
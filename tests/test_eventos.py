@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analisis_presion import WaterSystemPressureAnalyzer, DEFAULT_THRESHOLDS, STORAGE_MODES
+
+def write_logger(path, start, pressures, freq="min"):
+    timestamps = pd.date_range(start, periods=len(pressures), freq=freq)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Fecha y Hora;Presión (PSI)\n")
+        f.write("".join(f"{t:%d/%m/%Y %H:%M};{p:.2f}\n" for t, p in zip(timestamps, pressures)))
+    return path
+
+def load(path, storage="standard"):
+    analyzer = WaterSystemPressureAnalyzer(storage=storage)
+    analyzer.set_thresholds(DEFAULT_THRESHOLDS)
+    assert analyzer.load_data(str(path)), analyzer.last_error
+    return analyzer
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_serie_bajo_umbral_sin_eventos(tmp_path, storage):
+    # Ninguna lectura alcanza encendido_psi: sin episodios, pero con la columna categórica de estación.
+    analyzer = load(write_logger(tmp_path / "suspendido.csv", "2024-01-01", np.full(3 * 1440, 0.2)), storage)
+    assert analyzer.events.empty
+    assert isinstance(analyzer.events['station'].dtype, pd.CategoricalDtype)
+    assert list(analyzer.daily_metrics['duration_hours']) == [0, 0, 0]
+    assert list(analyzer.daily_metrics['service_windows']) == [0, 0, 0]
+    summary = analyzer.format_daily_summary(analyzer.classify_daily(analyzer.daily_metrics))
+    assert set(summary['Hora Llegada']) == {"N/A"}
+
+def test_agregar_lecturas_bajo_umbral(tmp_path):
+    analyzer = load(write_logger(tmp_path / "dia1.csv", "2024-01-01", np.full(1440, 0.2)))
+    assert analyzer.append_data(str(write_logger(tmp_path / "dia2.csv", "2024-01-02", np.full(1440, 0.5))))
+    assert analyzer.events.empty
+    assert len(analyzer.daily_metrics) == 2
+
+def test_hueco_cierra_el_episodio(tmp_path):
+    # Dos horas de servicio, tres horas sin lecturas y otras dos horas de servicio: el hueco no cuenta como servicio.
+    path = tmp_path / "hueco.csv"
+    write_logger(path, "2024-01-01 06:00", np.full(120, 15.0))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(f"{t:%d/%m/%Y %H:%M};15.00\n" for t in pd.date_range("2024-01-01 11:00", periods=120, freq="min")))
+    analyzer = load(path)
+    assert list(analyzer.events['start'].dt.strftime('%H:%M')) == ["06:00", "11:00"]
+    assert list(analyzer.events['end'].dt.strftime('%H:%M')) == ["07:59", "12:59"]
+    daily = analyzer.daily_metrics.iloc[0]
+    assert daily['service_windows'] == 2
+    assert daily['duration_hours'] == pytest.approx(2 * 119 / 60)
+
+def test_episodio_que_cruza_medianoche(tmp_path):
+    # Servicio de 22:00 a 02:00: dos horas en cada día, con corte a las 24:00 y llegada a las 00:00.
+    pressures = np.r_[np.full(120, 0.2), np.full(240, 15.0), np.full(120, 0.2)]
+    analyzer = load(write_logger(tmp_path / "medianoche.csv", "2024-01-01 20:00", pressures))
+    assert len(analyzer.events) == 1
+    daily = analyzer.daily_metrics
+    assert list(daily['duration_hours']) == pytest.approx([2.0, 2.0])
+    assert list(daily['service_windows']) == [1, 1]
+    summary = analyzer.format_daily_summary(analyzer.classify_daily(daily))
+    assert list(summary['Hora Llegada']) == ["22:00", "00:00"]
+    assert list(summary['Hora Corte']) == ["24:00", "02:00"]
@@ -0,0 +1,73 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from analisis_presion import AIReportJob, LRUCache, create_api_session
+
+SUMMARY = pd.DataFrame({'Fecha': ['01/01/2024'], 'Estado': ['Bueno']})
+
+def delta(text):
+    return f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}"
+
+class StandInAPI(BaseHTTPRequestHandler):
+    # Servidor SSE local: cada petición consume la siguiente respuesta programada (código, líneas de eventos).
+    protocol_version = 'HTTP/1.1'
+    responses, calls = [], []
+
+    def log_message(self, *args): pass
+
+    def do_POST(self):
+        self.calls.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        status, events = self.responses.pop(0)
+        if status != 200:
+            self.send_response(status); self.send_header('Content-Length', '0'); self.end_headers(); return
+        self.send_response(200); self.send_header('Content-Type', 'text/event-stream'); self.send_header('Transfer-Encoding', 'chunked'); self.end_headers()
+        for event in [": OPENROUTER PROCESSING"] + events:
+            data = f"{event}\n\n".encode()
+            self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n'); self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+@pytest.fixture
+def api():
+    StandInAPI.responses, StandInAPI.calls = [], []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield StandInAPI, f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    server.shutdown(); server.server_close()
+
+def run_job(url, cache, prompt="prompt"):
+    job = AIReportJob(SUMMARY, prompt, "clave", api_url=url, cache=cache, session=create_api_session(backoff=0))
+    return job, ''.join(job.iter_chunks())
+
+def test_reintento_tras_503_y_cache(api):
+    handler, url = api
+    handler.responses += [(503, []), (200, [delta("1. ASUNTO: "), delta("Análisis de presión."), "data: [DONE]"])]
+    cache = LRUCache(4)
+    job, text = run_job(url, cache)
+    assert text == "1. ASUNTO: Análisis de presión."
+    assert job.error is None and job.complete and len(handler.calls) == 2
+    job, text = run_job(url, cache)
+    assert job.from_cache and text == "1. ASUNTO: Análisis de presión."
+    assert len(handler.calls) == 2
+
+def test_error_como_texto(api):
+    handler, url = api
+    handler.responses.append((200, ['data: {"error": "cuota agotada"}']))
+    job, text = run_job(url, LRUCache(4))
+    assert job.error == "Error generando reporte: Error en la API: cuota agotada"
+    assert text == job.error
+
+def test_flujo_cortado_no_se_guarda(api):
+    handler, url = api
+    handler.responses += [(200, [delta("parcial")]), (200, [delta("completo"), "data: [DONE]"])]
+    cache = LRUCache(4)
+    job, text = run_job(url, cache)
+    assert not job.complete and job.error is not None
+    assert text.startswith("parcial") and job.error in text
+    assert cache.get(job.key) is None
+    job, text = run_job(url, cache)
+    assert not job.from_cache and text == "completo"
+    assert len(handler.calls) == 2